@@ -0,0 +1,258 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+A local simulated kojipkgs server for benchmarking.
+"""
+
+import datetime
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+INDEX_HEADER = """\
+<html>
+ <head>
+  <title>Index of /compose/twoweek</title>
+ </head>
+ <body>
+"""
+
+INDEX_ENTRY = (
+    '<img src="/icons/folder.gif" alt="[DIR]"> '
+    '<a href="{0}/">{0}/</a> {1}    -   \n')
+
+INDEX_FOOTER = """\
+ </body>
+</html>
+"""
+
+STATUS_RE = re.compile(r'^/compose/twoweek/(?P<version>[^/]+)/STATUS$')
+IMAGE_RE = re.compile(
+    r'^/compose/twoweek/(?P<version>[^/]+)/compose/CloudImages/'
+    r'x86_64/images/(?P=version)\.x86_64\.qcow2$')
+
+#: Size of the zero filled block used when streaming images.
+BLOCK_SIZE = 64 * 1024
+
+
+def generate_versions(count, release=27, start=datetime.date(2018, 1, 1)):
+    """
+    Generates a deterministic list of compose versions.
+
+    :param count: The number of composes to generate.
+    :type count: int
+    :param release: The Fedora release of the composes.
+    :type release: int
+    :param start: The date of the first compose.
+    :type start: datetime.date
+    :returns: Compose versions, newest first
+    :rtype: list
+    """
+    versions = []
+    for x in range(count):
+        date = start + datetime.timedelta(days=x // 2)
+        versions.append('Fedora-Atomic-{}-{}.{}'.format(
+            release, date.strftime('%Y%m%d'), x % 2))
+    versions.reverse()
+    return versions
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SimulatedKojipkgs:
+    """
+    A threaded http server mimicking the twoweek compose area of kojipkgs.
+
+    Example::
+
+       with SimulatedKojipkgs(composes=500, status_latency=0.01) as koji:
+           check = AtomicStatusCheck(
+               compose_endpoint_tpl=koji.compose_endpoint_tpl,
+               version_endpoint=koji.version_endpoint)
+    """
+
+    def __init__(self, composes=100, status_latency=0.0,
+                 failure_rate=0.0, image_size=0, seed=0):
+        """
+        Initializes a new instance of SimulatedKojipkgs.
+
+        :param composes: Number of composes listed in the twoweek index.
+        :type composes: int
+        :param status_latency: Seconds to wait before answering STATUS.
+        :type status_latency: float
+        :param failure_rate: Fraction (0.0-1.0) of STATUS requests that fail.
+        :type failure_rate: float
+        :param image_size: Size in bytes of every served qcow2 image.
+        :type image_size: int
+        :param seed: Seed for the failure injection.
+        :type seed: int
+        """
+        self.versions = generate_versions(composes)
+        self.status_latency = status_latency
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._index = self._render_index()
+        self._server = None
+        self._thread = None
+
+    def _render_index(self):
+        """
+        Renders the twoweek index page once so serving it is cheap.
+        """
+        parts = [INDEX_HEADER, INDEX_ENTRY.format(
+            'latest-Fedora-Atomic-27', '2018-02-13 05:15')]
+        for version in self.versions:
+            parts.append(INDEX_ENTRY.format(version, '2018-02-13 05:15'))
+        parts.append(INDEX_FOOTER)
+        return ''.join(parts).encode('utf8')
+
+    def should_fail(self):
+        """
+        Decides if the current STATUS request should fail.
+
+        :returns: True if the request should get an error response
+        :rtype: bool
+        """
+        with self._random_lock:
+            return self._random.random() < self.failure_rate
+
+    @property
+    def base_url(self):
+        """
+        Property returning the root url of the running server.
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/compose/twoweek/'.format(host, port)
+
+    @property
+    def version_endpoint(self):
+        """
+        Property returning the twoweek index url.
+        """
+        return self.base_url + '?C=M;O=D'
+
+    @property
+    def compose_endpoint_tpl(self):
+        """
+        Property returning the STATUS url template.
+        """
+        return self.base_url + '{}/STATUS'
+
+    def image_url(self, version):
+        """
+        Returns the qcow2 image url for a version.
+
+        :param version: The version of the image.
+        :type version: str
+        :returns: The full url to the image
+        :rtype: str
+        """
+        return (self.base_url + '{0}/compose/CloudImages/x86_64/images/'
+                '{0}.x86_64.qcow2').format(version)
+
+    def start(self):
+        """
+        Starts serving on a random local port in a background thread.
+        """
+        handler = type('Handler', (_Handler, ), {'koji': self})
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server if it is running.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        """
+        Used for context management.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """
+        Stop the server on context management exit.
+        """
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Request handler bound to a SimulatedKojipkgs instance.
+    """
+
+    koji = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        """
+        Keep benchmark output quiet.
+        """
+        pass
+
+    def _send(self, code, body, content_type='text/plain'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/compose/twoweek/':
+            return self._send(200, self.koji._index, 'text/html')
+        if STATUS_RE.match(path):
+            return self._status()
+        if IMAGE_RE.match(path):
+            return self._image()
+        self._send(404, b'Not Found\n')
+
+    def _status(self):
+        if self.koji.status_latency:
+            time.sleep(self.koji.status_latency)
+        if self.koji.should_fail():
+            return self._send(500, b'Internal Server Error\n')
+        self._send(200, b'FINISHED\n')
+
+    def _image(self):
+        # Images are sparse: zeros are generated while streaming and never
+        # held in memory or on disk.
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(self.koji.image_size))
+        self.end_headers()
+        block = bytes(BLOCK_SIZE)
+        remaining = self.koji.image_size
+        while remaining > 0:
+            chunk = block[:min(remaining, BLOCK_SIZE)]
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
@@ -0,0 +1,306 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark suite for the release dashboard.
+
+Run from the top of the source tree::
+
+   $ PYTHONPATH=src python -m bench.run
+   $ PYTHONPATH=src python -m bench.run --compare bench/results/abc1234.json
+
+Results are written as JSON to bench/results/<commit>.json by default.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from release_dashboard.checks import AtomicStatusCheck, download
+from release_dashboard.checks.version import ComposeVersion, VersionList
+from release_dashboard.trackers import Tracker
+
+from bench.kojipkgs import SimulatedKojipkgs, generate_versions
+
+
+#: Registered benchmarks in the order they run.
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """
+    Registers a benchmark function.
+    """
+    BENCHMARKS.append(func)
+    return func
+
+
+def measure(func, repeat):
+    """
+    Times func repeat times.
+
+    :param func: Callable to time.
+    :type func: callable
+    :param repeat: How many times to run func.
+    :type repeat: int
+    :returns: min, median and mean timings in seconds
+    :rtype: dict
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'repeat': repeat,
+    }
+
+
+class RenderTracker(Tracker):
+    """
+    Tracker which hands back the rendered content instead of filing it.
+    Also used by the tests rendering templates.
+    """
+
+    def create_issue(self, title, content, **kwargs):
+        return content
+
+
+def _check(koji):
+    return AtomicStatusCheck(
+        compose_endpoint_tpl=koji.compose_endpoint_tpl,
+        version_endpoint=koji.version_endpoint)
+
+
+@benchmark
+def get_versions(args):
+    """
+    Parsing the twoweek index into versions.
+    """
+    with SimulatedKojipkgs(composes=args.composes) as koji:
+        check = _check(koji)
+        result = measure(lambda: list(check.get_versions()), args.repeat)
+    result['composes'] = args.composes
+    return result
+
+
+def _absent(version):
+    """
+    Returns a valid version which generate_versions never creates, as it
+    only uses respins 0 and 1.
+    """
+    version = ComposeVersion.parse(version)
+    return str(ComposeVersion(
+        version.name, version.release, version.date, version.respin + 2))
+
+
+@benchmark
+def has_version(args):
+    """
+    Looking up every known version plus as many misses.
+    """
+    with SimulatedKojipkgs(composes=args.composes) as koji:
+        check = _check(koji)
+        check.versions
+        lookups = koji.versions + [_absent(v) for v in koji.versions]
+
+    def run():
+        for version in lookups:
+            check.has_version(version)
+
+    result = measure(run, args.repeat)
+    result['lookups'] = len(lookups)
+    return result
+
+
+@benchmark
+def version_sort(args):
+    """
+    Parsing and sorting a large history of compose versions.
+    """
+    strings = generate_versions(args.history)
+
+    def run():
+        versions = VersionList(strings)
+        versions.sort()
+
+    result = measure(run, args.repeat)
+    versions = VersionList(strings)
+    result['versions'] = args.history
+    result['column_bytes'] = versions.nbytes
+    result['string_bytes'] = sum(sys.getsizeof(s) for s in strings)
+    return result
+
+
+@benchmark
+def bulk_status(args):
+    """
+    Checking the STATUS of every compose with latency and failures.
+    """
+    with SimulatedKojipkgs(
+            composes=args.status_composes,
+            status_latency=args.status_latency,
+            failure_rate=args.failure_rate) as koji:
+        check = _check(koji)
+
+        def run():
+            for version in koji.versions:
+                check.verify_compose_status(version)
+
+        result = measure(run, args.repeat)
+    result.update({
+        'composes': args.status_composes,
+        'latency': args.status_latency,
+        'failure_rate': args.failure_rate,
+    })
+    return result
+
+
+@benchmark
+def image_download(args):
+    """
+    Downloading a qcow2 sized image to disk.
+
+    This is the streamed download OstreeVersionSniffer.download_image uses,
+    called directly so it runs without libguestfs.
+    """
+    with SimulatedKojipkgs(composes=1, image_size=args.image_size) as koji:
+        url = koji.image_url(koji.versions[0])
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        def run():
+            download(url, path)
+
+        try:
+            result = measure(run, args.repeat)
+        finally:
+            os.unlink(path)
+    result['bytes'] = args.image_size
+    result['mib_per_second'] = (
+        args.image_size / (1024 * 1024) / result['median'])
+    return result
+
+
+@benchmark
+def template_render(args):
+    """
+    Rendering the release request template.
+    """
+    tracker = RenderTracker()
+    context = {
+        'compose': ComposeVersion.parse('Fedora-Atomic-27-20180213.0'),
+        'ostree_pungi_id': '20180212.0',
+    }
+
+    def run():
+        for _ in range(args.renders):
+            tracker.create_templatized_issue(
+                'title', 'create_release_request.txt', context)
+
+    result = measure(run, args.repeat)
+    result['renders'] = args.renders
+    return result
+
+
+def current_commit():
+    """
+    Returns the short hash of HEAD or 'unknown' outside of git.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, previous):
+    """
+    Prints the median ratio of current against previous results.
+
+    :param current: Results from this run.
+    :type current: dict
+    :param previous: Results loaded from an earlier run.
+    :type previous: dict
+    """
+    print('\n{:<20} {:>12} {:>12} {:>8}'.format(
+        'benchmark', previous['commit'], current['commit'], 'ratio'))
+    for name, result in sorted(current['benchmarks'].items()):
+        old = previous['benchmarks'].get(name, {})
+        if 'median' not in result or 'median' not in old:
+            continue
+        print('{:<20} {:>12.6f} {:>12.6f} {:>8.2f}'.format(
+            name, old['median'], result['median'],
+            result['median'] / old['median']))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--composes', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=200000)
+    parser.add_argument('--status-composes', type=int, default=100)
+    parser.add_argument('--status-latency', type=float, default=0.005)
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--image-size', type=int, default=64 * 1024 * 1024)
+    parser.add_argument('--renders', type=int, default=1000)
+    parser.add_argument(
+        '--only', action='append', help='Only run the named benchmark(s)')
+    parser.add_argument('--output', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Earlier JSON results to compare')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Injected STATUS failures would otherwise flood stderr with warnings
+    logging.getLogger('AtomicStatusCheck').addHandler(logging.NullHandler())
+    results = {
+        'commit': current_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'benchmarks': {},
+    }
+    for func in BENCHMARKS:
+        if args.only and func.__name__ not in args.only:
+            continue
+        print('Running {} ...'.format(func.__name__), file=sys.stderr)
+        results['benchmarks'][func.__name__] = func(args)
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), 'results',
+        '{}.json'.format(results['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fobj:
+        json.dump(results, fobj, indent=2, sort_keys=True)
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.compare:
+        with open(args.compare, 'r') as fobj:
+            compare(results, json.load(fobj))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Historical backfill of archived composes.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import (
+    ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait)
+from urllib.parse import urljoin
+
+import requests
+
+from release_dashboard.checks import (
+    IMAGE_PATH_TPL, TERMINAL_STATUSES, TWOWEEK_URL, iter_links,
+    ostree_version_sniffer)
+from release_dashboard.checks.version import ComposeVersion, VersionError
+
+
+#: Columns of a backfilled compose record.
+FIELDS = ('version', 'status', 'ostree_version', 'image_size', 'error',
+          'checked')
+
+#: A compose found in an archive and the url of its directory.
+ArchivedCompose = namedtuple('ArchivedCompose', ['version', 'url'])
+
+
+class ArchiveIndex:
+    """
+    Walks the directory listings of a compose archive. Compose directories
+    whose name has the prefix are yielded as they are parsed and other
+    directories are descended into, so any number of composes is walked
+    in bounded memory. Every listing waits for the limiter if one is set.
+
+    Example::
+
+       index = ArchiveIndex('https://kojipkgs.fedoraproject.org/compose/')
+       for compose in index.walk():
+           print(compose.version, compose.url)
+    """
+
+    def __init__(self, url=TWOWEEK_URL, max_depth=1, exclude=('latest-', ),
+                 prefix='Fedora-Atomic-', limiter=None, session=None,
+                 logger=None):
+        """
+        Initializes a new instance of ArchiveIndex.
+
+        :param url: Url of the top directory listing.
+        :type url: str
+        :param max_depth: Levels of non compose directories to descend.
+        :type max_depth: int
+        :param exclude: Prefixes of directories never descended into.
+        :type exclude: tuple
+        :param prefix: Prefix of the names of composes to yield.
+        :type prefix: str
+        :param limiter: Optional limiter to wait for before each listing.
+        :type limiter: release_dashboard.backfill.RateLimiter
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self.url = url
+        self._max_depth = max_depth
+        self._exclude = tuple(exclude)
+        self._prefix = prefix
+        self.limiter = limiter
+        self._http = session if session is not None else requests
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('ArchiveIndex')
+
+    def _directory_name(self, href):
+        """
+        Returns the name of a linked subdirectory or None for other links.
+        """
+        if not href.endswith('/') or href.startswith(('/', '?', '.')):
+            return None
+        name = href[:-1]
+        if '/' in name or ':' in name:
+            return None
+        return name
+
+    def _descend(self, name, depth):
+        """
+        Decides if a non compose directory should be walked.
+        """
+        if name.startswith(self._exclude):
+            return False
+        return depth < self._max_depth
+
+    def _list(self, url, depth, subdirs):
+        """
+        Yields the composes of a single listing and collects the
+        directories to descend into.
+        """
+        self._logger.info('Listing %s', url)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        resp = self._http.get(url, stream=True)
+        try:
+            if resp.status_code != 200:
+                self._logger.warning(
+                    'Received a non 200 response from %s: %d',
+                    url, resp.status_code)
+                return
+            for href in iter_links(resp):
+                name = self._directory_name(href)
+                if name is None:
+                    continue
+                try:
+                    version = ComposeVersion.parse(name)
+                except VersionError:
+                    if self._descend(name, depth):
+                        subdirs.append((urljoin(url, href), depth + 1))
+                    continue
+                if name.startswith(self._prefix):
+                    yield ArchivedCompose(version, urljoin(url, href))
+        finally:
+            resp.close()
+
+    def walk(self):
+        """
+        Finds every compose in the archive.
+
+        :returns: A generator of composes in listing order
+        :rtype: generator of release_dashboard.backfill.ArchivedCompose
+        """
+        pending = [(self.url, 0)]
+        seen = set()
+        while pending:
+            url, depth = pending.pop()
+            if url in seen:
+                continue
+            seen.add(url)
+            subdirs = []
+            yield from self._list(url, depth, subdirs)
+            pending.extend(reversed(subdirs))
+
+
+class RateLimiter:
+    """
+    Thread safe limiter allowing rate calls per second on average.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        """
+        Initializes a new instance of RateLimiter.
+
+        :param rate: Calls allowed per second. None or 0 disables limiting.
+        :type rate: float
+        :param clock: Monotonic clock to use.
+        :type clock: callable
+        :param sleep: Sleep function to use.
+        :type sleep: callable
+        """
+        self._interval = 1.0 / rate if rate else 0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until the next call is allowed.
+        """
+        if not self._interval:
+            return
+        with self._lock:
+            now = self._clock()
+            wait_for = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if wait_for > 0:
+            self._sleep(wait_for)
+
+
+class BackfillStore:
+    """
+    SQLite backed store of compose records. Records are committed in
+    batches; every commit is a checkpoint an interrupted run resumes from.
+    """
+
+    def __init__(self, path, checkpoint_every=50):
+        """
+        Initializes a new instance of BackfillStore.
+
+        :param path: Path to the SQLite database.
+        :type path: str
+        :param checkpoint_every: Records to buffer between commits.
+        :type checkpoint_every: int
+        """
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS composes ('
+            'version TEXT PRIMARY KEY, status TEXT, ostree_version TEXT, '
+            'image_size INTEGER, error TEXT, checked REAL)')
+        self._conn.commit()
+        self._checkpoint_every = checkpoint_every
+        self._pending = 0
+
+    def done(self, version):
+        """
+        Checks if a compose was already backfilled without errors in a status
+        which can not change anymore.
+
+        :param version: Version string of the compose.
+        :type version: str
+        :rtype: bool
+        """
+        row = self._conn.execute(
+            'SELECT 1 FROM composes WHERE version = ? AND error IS NULL '
+            'AND status IN ({})'.format(', '.join('?' * len(
+                TERMINAL_STATUSES))),
+            (version, ) + TERMINAL_STATUSES).fetchone()
+        return row is not None
+
+    def save(self, record):
+        """
+        Saves a record, committing once enough records are buffered.
+
+        :param record: Mapping with the keys in FIELDS.
+        :type record: dict
+        """
+        self._conn.execute(
+            'INSERT OR REPLACE INTO composes ({}) VALUES ({})'.format(
+                ', '.join(FIELDS), ', '.join('?' * len(FIELDS))),
+            [record.get(field) for field in FIELDS])
+        self._pending += 1
+        if self._pending >= self._checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Commits all buffered records.
+        """
+        self._conn.commit()
+        self._pending = 0
+
+    def records(self):
+        """
+        Iterates over all stored records ordered by version.
+
+        :returns: A generator of record dictionaries
+        :rtype: generator
+        """
+        cursor = self._conn.execute(
+            'SELECT {} FROM composes ORDER BY version'.format(
+                ', '.join(FIELDS)))
+        for row in cursor:
+            yield dict(zip(FIELDS, row))
+
+    def close(self):
+        """
+        Checkpoints and closes the database.
+        """
+        self.checkpoint()
+        self._conn.close()
+
+
+class Backfill:
+    """
+    Walks a compose archive concurrently and stores the status, image size
+    and optionally the ostree version of every compose not stored yet.
+    STATUS and images are read relative to each compose's directory. Only
+    a bounded number of composes are in flight at any time.
+
+    Example::
+
+       store = BackfillStore('history.sqlite')
+       Backfill(store, ArchiveIndex(archive_url), workers=4, rate=2).run()
+       store.close()
+    """
+
+    def __init__(self, store, index=None, workers=4, rate=2.0,
+                 sniff_ostree=False, status_path='STATUS',
+                 image_path_tpl=IMAGE_PATH_TPL, session=None, logger=None):
+        """
+        Initializes a new instance of Backfill.
+
+        :param store: Where records are persisted.
+        :type store: release_dashboard.backfill.BackfillStore
+        :param index: Archive to walk. Default: the twoweek composes.
+        :type index: release_dashboard.backfill.ArchiveIndex
+        :param workers: Number of composes processed at the same time.
+        :type workers: int
+        :param rate: Maximum requests per second against the server.
+        :type rate: float
+        :param sniff_ostree: Download finished images for the ostree version.
+        :type sniff_ostree: bool
+        :param status_path: Path of the STATUS file within a compose.
+        :type status_path: str
+        :param image_path_tpl: Path template of the qcow2 image within a
+            compose, given the version.
+        :type image_path_tpl: str
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._store = store
+        self._session = session
+        self._http = session if session is not None else requests
+        self._limiter = RateLimiter(rate)
+        self._index = index if index is not None else ArchiveIndex(
+            session=session)
+        if self._index.limiter is None:
+            # Listings count against the rate like every other request
+            self._index.limiter = self._limiter
+        self._workers = workers
+        self._sniff_ostree = sniff_ostree
+        self._status_path = status_path
+        self._image_path_tpl = image_path_tpl
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('Backfill')
+
+    def _image_url(self, compose):
+        return urljoin(
+            compose.url, self._image_path_tpl.format(compose.version))
+
+    def _status(self, compose):
+        """
+        Reads the lower cased STATUS of a compose or None.
+        """
+        self._limiter.acquire()
+        resp = self._http.get(urljoin(compose.url, self._status_path))
+        if resp.status_code != 200:
+            return None
+        return resp.text.strip().lower()
+
+    def _image_size(self, compose):
+        """
+        Reads the size of a compose's image without downloading it.
+        """
+        self._limiter.acquire()
+        resp = self._http.head(self._image_url(compose), allow_redirects=True)
+        if resp.status_code != 200:
+            return None
+        return int(resp.headers.get('Content-Length', 0)) or None
+
+    def _ostree_version(self, compose):
+        """
+        Downloads a compose's image to read its ostree version.
+        """
+        self._limiter.acquire()
+        sniffer = ostree_version_sniffer(
+            str(compose.version), session=self._session)
+        try:
+            sniffer.download_image(
+                str(compose.version), url=self._image_url(compose))
+            return sniffer.get_ostree_version()
+        finally:
+            sniffer.clean_up()
+
+    def fetch(self, compose):
+        """
+        Collects the record of a single compose.
+
+        :param compose: The compose to collect.
+        :type compose: release_dashboard.backfill.ArchivedCompose
+        :returns: Mapping with the keys in FIELDS
+        :rtype: dict
+        """
+        record = {'version': str(compose.version), 'checked': time.time()}
+        try:
+            record['status'] = self._status(compose)
+            if record['status'] is None:
+                record['error'] = 'STATUS could not be read'
+                return record
+            record['image_size'] = self._image_size(compose)
+            if self._sniff_ostree and record['status'] == 'finished':
+                record['ostree_version'] = self._ostree_version(compose)
+        except Exception as err:
+            self._logger.warning(
+                'Unable to backfill %s: %s', compose.version, err)
+            record['error'] = '{}: {}'.format(type(err).__name__, err)
+        return record
+
+    def _save_done(self, running, return_when):
+        """
+        Waits for running fetches and saves the finished ones.
+        """
+        done, _ = wait(running, return_when=return_when)
+        for future in done:
+            running.discard(future)
+            self._store.save(future.result())
+        return len(done)
+
+    def run(self):
+        """
+        Backfills every compose in the archive which is not stored yet.
+
+        :returns: The number of composes processed
+        :rtype: int
+        """
+        processed = 0
+        running = set()
+        window = self._workers * 2
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                for compose in self._index.walk():
+                    if self._store.done(str(compose.version)):
+                        self._logger.debug(
+                            'Skipping stored %s', compose.version)
+                        continue
+                    if len(running) >= window:
+                        processed += self._save_done(
+                            running, FIRST_COMPLETED)
+                    running.add(executor.submit(self.fetch, compose))
+                if running:
+                    processed += self._save_done(running, ALL_COMPLETED)
+        finally:
+            # Keep whatever finished, even when interrupted
+            self._store.checkpoint()
+        self._logger.info('Backfilled %d composes', processed)
+        return processed
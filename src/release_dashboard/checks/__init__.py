@@ -17,11 +17,114 @@ Various check classes and functions.
 """
 
 
+import codecs
 import logging
 
+from html.parser import HTMLParser
+from urllib.parse import unquote
+
 import requests
 
-from bs4 import BeautifulSoup
+from release_dashboard.checks.version import (
+    ComposeVersion, VersionError, VersionList)
+
+
+#: Default location of the twoweek composes.
+TWOWEEK_URL = 'https://kojipkgs.fedoraproject.org/compose/twoweek/'
+
+#: Path template of a compose's qcow2 cloud image within the compose.
+IMAGE_PATH_TPL = 'compose/CloudImages/x86_64/images/{0}.x86_64.qcow2'
+
+#: Default url template of a compose's qcow2 cloud image.
+IMAGE_URL_TPL = TWOWEEK_URL + '{0}/' + IMAGE_PATH_TPL
+
+#: Compose statuses which never change again.
+TERMINAL_STATUSES = (
+    'finished', 'finished_incomplete', 'doomed', 'terminated', 'failed')
+
+
+class _LinkParser(HTMLParser):
+    """
+    Collects the href of every link fed to it.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(unquote(href))
+
+
+def iter_links(resp, chunk_size=65536):
+    """
+    Parses the links of a streamed directory index as it arrives, so memory
+    use does not grow with the size of the index.
+
+    :param resp: A response requested with stream=True.
+    :type resp: requests.Response
+    :param chunk_size: Bytes read from the response at a time.
+    :type chunk_size: int
+    :returns: A generator of link targets
+    :rtype: generator
+    """
+    decoder = codecs.getincrementaldecoder(resp.encoding or 'utf-8')(
+        errors='replace')
+    parser = _LinkParser()
+    for chunk in resp.iter_content(chunk_size=chunk_size):
+        parser.feed(decoder.decode(chunk))
+        yield from parser.links
+        parser.links = []
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from parser.links
+
+
+def download(url, path, session=None, chunk_size=1024):
+    """
+    Streams a url to a file without holding it in memory.
+
+    :param url: The url to download.
+    :type url: str
+    :param path: Where to write the download.
+    :type path: str
+    :param session: Optional session to send requests with.
+    :type session: requests.Session
+    :param chunk_size: Bytes read from the response at a time.
+    :type chunk_size: int
+    :returns: The number of bytes written
+    :rtype: int
+    """
+    http = session if session is not None else requests
+    r = http.get(url, stream=True)
+    if r.status_code != 200:
+        raise Exception(
+            'Non 200 result getting install.img: {}'.format(r.status_code))
+    written = 0
+    with open(path, 'wb') as fobj:
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if chunk:
+                fobj.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def ostree_version_sniffer(version, **kwargs):
+    """
+    Creates an OstreeVersionSniffer. Its module is imported on first use
+    as it needs guestfs, which nothing else does.
+
+    :param version: The version of the compose to sniff.
+    :type version: str
+    :param kwargs: Passed on to OstreeVersionSniffer.
+    :type kwargs: dict
+    :rtype: release_dashboard.checks.ostree_version.OstreeVersionSniffer
+    """
+    from release_dashboard.checks.ostree_version import OstreeVersionSniffer
+    return OstreeVersionSniffer(version, **kwargs)
 
 
 class AtomicStatusCheck:
@@ -30,7 +133,8 @@ class AtomicStatusCheck:
     """
 
     def __init__(self, logger=None,
-                 compose_endpoint_tpl=None, version_endpoint=None):
+                 compose_endpoint_tpl=None, version_endpoint=None,
+                 session=None, updates_endpoint=None):
         """
         Initializes a new instance of AtomicStatusCheck.
 
@@ -40,8 +144,13 @@ class AtomicStatusCheck:
         :type compose_endpoint_tpl: str
         :param version_endpoint: Optional version url for version list.
         :type version_endpoint: str
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
+        :param updates_endpoint: Optional url for the updates compose list.
+        :type updates_endpoint: str
         """
-        self._versions = []
+        self._versions = VersionList()
+        self._http = session if session is not None else requests
         self._compose_endpoint_tpl = (
             'https://kojipkgs.fedoraproject.org/compose/twoweek/{}/STATUS')
         if compose_endpoint_tpl is not None:
@@ -50,6 +159,10 @@ class AtomicStatusCheck:
             'https://kojipkgs.fedoraproject.org/compose/twoweek/?C=M;O=D')
         if version_endpoint is not None:
             self._version_endpoint = version_endpoint
+        self._updates_endpoint = (
+            'https://kojipkgs.fedoraproject.org/compose/updates/?C=M;O=D')
+        if updates_endpoint is not None:
+            self._updates_endpoint = updates_endpoint
         if logger is not None:
             self._logger = logger
         else:
@@ -58,66 +171,124 @@ class AtomicStatusCheck:
     @property
     def versions(self):
         """
-        Property that lists all known versions.
+        Property that lists all known versions as a VersionList.
         """
         if len(self._versions) == 0:
             self._logger.debug('No versions loaded. Loading from remote.')
-            self._versions = [x for x in self.get_versions()]
+            self._versions = VersionList(self.get_versions())
             self._logger.info('Loaded %d versions', len(self._versions))
         else:
             self._logger.debug('Versions already loaded. Reusing.')
         return self._versions
 
-    def verify_compose_status(self, version):
+    def get_compose_status(self, version):
         """
-        Verifies if a compose has finished.
+        Gets the raw status of a compose.
 
-        :param version: Version string to check.
-        :type version: str
-        :returns: True if the composes is finished, otherwise False
-        :rtype: bool
+        :param version: Version to check.
+        :type version: release_dashboard.checks.version.ComposeVersion
+        :returns: The lower cased status or None if it could not be read
+        :rtype: str
         """
         url = self._compose_endpoint_tpl.format(version)
         self._logger.info('Verifying status via %s', url)
-        resp = requests.get(url)
+        resp = self._http.get(url)
         if resp.status_code == 200:
-            status = resp.text.lower()[:-1]
             self._logger.debug('Result from url: %s', resp.text)
-            if status == 'finished':
-                return True
-        else:
-            self._logger.warn(
-                'Received a non 200 response: %d', resp.status_code)
-        return False
+            return resp.text.strip().lower()
+        self._logger.warn(
+            'Received a non 200 response: %d', resp.status_code)
+        return None
+
+    def verify_compose_status(self, version):
+        """
+        Verifies if a compose has finished.
+
+        :param version: Version to check.
+        :type version: release_dashboard.checks.version.ComposeVersion
+        :returns: True if the composes is finished, otherwise False
+        :rtype: bool
+        """
+        return self.get_compose_status(version) == 'finished'
 
     def get_versions(self):
         """
         Uses the version_endpoint to find all known versions as a generator.
 
         :returns: A generator that returns the next known version on iteration
-        :rtype: generator
+        :rtype: generator of release_dashboard.checks.version.ComposeVersion
         """
-        self._logger.info('Getting versions from %s', self._version_endpoint)
-        resp = requests.get(self._version_endpoint)
-        if resp.status_code == 200:
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            for node in soup.find_all('a'):
-                text = node.get_text()
-                if text.startswith('Fedora-Atomic-'):
-                    self._logger.debug('Found %s', text[:-1])
-                    yield text[:-1]
-        else:
-            self._logger.warn(
-                'Received a non 200 response: %d', resp.status_code)
-            return []
+        for text in self._index_entries(self._version_endpoint):
+            if not text.startswith('Fedora-Atomic-'):
+                continue
+            try:
+                version = ComposeVersion.parse(text)
+            except VersionError:
+                self._logger.debug('Skipping %s', text)
+                continue
+            self._logger.debug('Found %s', version)
+            yield version
+
+    def _index_entries(self, url):
+        """
+        Yields the names linked from a directory index, without trailing
+        slashes.
+        """
+        self._logger.info('Getting versions from %s', url)
+        resp = self._http.get(url, stream=True)
+        try:
+            if resp.status_code != 200:
+                self._logger.warn(
+                    'Received a non 200 response: %d', resp.status_code)
+                return
+            for href in iter_links(resp):
+                yield href.rstrip('/')
+        finally:
+            resp.close()
+
+    def get_updates_composes(self, release):
+        """
+        Finds the updates composes of a release, such as
+        Fedora-27-updates-20180212.0, as a generator.
+
+        :param release: The release, for example 27.
+        :type release: str
+        :returns: A generator of updates compose versions
+        :rtype: generator of release_dashboard.checks.version.ComposeVersion
+        """
+        name = 'Fedora-{}'.format(release)
+        for text in self._index_entries(self._updates_endpoint):
+            try:
+                version = ComposeVersion.parse(text)
+            except VersionError:
+                continue
+            if version.name == name and version.release == 'updates':
+                yield version
+
+    def latest_updates_compose(self, version):
+        """
+        Finds the updates compose an atomic compose took its ostree from:
+        the latest updates compose of the release dated before it.
+
+        :param version: The atomic compose version.
+        :type version: release_dashboard.checks.version.ComposeVersion
+        :returns: The updates compose or None if there is none
+        :rtype: release_dashboard.checks.version.ComposeVersion
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        version = ComposeVersion.parse(version)
+        candidates = [
+            updates for updates in self.get_updates_composes(version.release)
+            if updates.date < version.date]
+        return max(candidates, default=None)
 
     def has_version(self, version):
         """
         Checks a given version against the known versions from the
         version endpoint.
 
-        :param version: Version string to check.
-        :type version: str
+        :param version: Version or version string to check.
+        :type version: release_dashboard.checks.version.ComposeVersion
         :returns: True if the version is known, otherwise False
         :rtype: bool
         """
@@ -0,0 +1,443 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Package differences between composes.
+"""
+
+import codecs
+import json
+import logging
+import re
+import sys
+
+from collections import OrderedDict
+
+import requests
+
+from release_dashboard.checks import AtomicStatusCheck
+from release_dashboard.checks.rpmvercmp import evrcmp
+from release_dashboard.checks.version import ComposeVersion, VersionList
+
+
+_TOKEN_RE = re.compile(
+    r'\s*(?:(?P<punct>[{}\[\]:,])'
+    r'|"(?P<string>(?:[^"\\]|\\.)*)"'
+    r'|(?P<literal>[^\s{}\[\]:,"]+))')
+
+
+class ComposeDiffError(Exception):
+    """
+    Base error for compose diffs.
+    """
+    pass
+
+
+def _tokens(chunks):
+    """
+    Tokenizes JSON arriving in chunks without holding the whole document.
+
+    :param chunks: Iterable of bytes or str.
+    :type chunks: iterable
+    :returns: A generator of (kind, value) tuples
+    :rtype: generator
+    """
+    decoder = codecs.getincrementaldecoder('utf8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    done = False
+    while True:
+        match = _TOKEN_RE.match(buf, pos)
+        # A token touching the end of the buffer may continue in the next
+        # chunk, so only trust it once more data or the end has been seen.
+        if match is None or (match.end() == len(buf) and not done):
+            if done:
+                if buf[pos:].strip():
+                    raise ComposeDiffError(
+                        'Invalid JSON near: {}'.format(buf[pos:pos + 20]))
+                return
+            chunk = next(chunks, None)
+            if chunk is None:
+                done = True
+                chunk = b''
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final=done)
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        pos = match.end()
+        yield match.lastgroup, match.group(match.lastgroup)
+
+
+def iter_rpms(chunks):
+    """
+    Stream parses a compose's metadata/rpms.json.
+
+    :param chunks: Iterable of bytes or str making up the document.
+    :type chunks: iterable
+    :returns: A generator of (variant, arch, nevra) tuples
+    :rtype: generator
+    :raises: release_dashboard.checks.compose_diff.ComposeDiffError
+    """
+    stack = []
+    path = []
+    expect_key = False
+    for kind, value in _tokens(chunks):
+        if kind == 'punct':
+            if value in '{[':
+                stack.append(value)
+                path.append(None)
+                expect_key = value == '{'
+            elif value in '}]':
+                stack.pop()
+                path.pop()
+            elif value == ',':
+                expect_key = stack[-1] == '{'
+        elif kind == 'string' and expect_key:
+            if '\\' in value:
+                value = json.loads('"{}"'.format(value))
+            path[-1] = value
+            expect_key = False
+            # payload -> rpms -> variant -> arch -> srpm -> rpm
+            if len(path) == 6 and path[:2] == ['payload', 'rpms']:
+                yield path[2], path[3], value
+
+
+def split_nevra(nevra):
+    """
+    Splits a name-epoch:version-release.arch string into interned parts.
+
+    :param nevra: The NEVRA to split.
+    :type nevra: str
+    :returns: Tuple of (name, arch, (epoch, version, release))
+    :rtype: tuple
+    """
+    nevr, arch = nevra.rsplit('.', 1)
+    name, epoch_version, release = nevr.rsplit('-', 2)
+    epoch, _, version = epoch_version.rpartition(':')
+    return (sys.intern(name), sys.intern(arch), (
+        sys.intern(epoch or '0'), sys.intern(version), sys.intern(release)))
+
+
+def format_evr(evr):
+    """
+    Formats an (epoch, version, release) tuple as epoch:version-release.
+    """
+    return '{}:{}-{}'.format(*evr)
+
+
+class PackageSet:
+    """
+    The packages of a compose keyed by (name, arch) with interned strings.
+    """
+
+    __slots__ = ('version', '_packages')
+
+    def __init__(self, version, nevras=()):
+        """
+        Initializes a new instance of PackageSet.
+
+        :param version: The compose the packages belong to.
+        :type version: str
+        :param nevras: The NEVRA strings of the packages.
+        :type nevras: iterable
+        """
+        self.version = version
+        self._packages = {}
+        for nevra in nevras:
+            name, arch, evr = split_nevra(nevra)
+            self._packages[(name, arch)] = evr
+
+    def __len__(self):
+        return len(self._packages)
+
+    def __iter__(self):
+        return iter(self._packages.items())
+
+    def get(self, key):
+        """
+        Returns the (epoch, version, release) of a (name, arch) or None.
+        """
+        return self._packages.get(key)
+
+
+class PackageDiff:
+    """
+    Changes between two composes, stored as (name, arch) mapped to the old
+    and new (epoch, version, release). A side is None when the package was
+    not in that compose.
+    """
+
+    __slots__ = ('old', 'new', 'changes')
+
+    def __init__(self, old, new, changes):
+        """
+        Initializes a new instance of PackageDiff.
+
+        :param old: The older compose.
+        :type old: str
+        :param new: The newer compose.
+        :type new: str
+        :param changes: Mapping of (name, arch) to (old evr, new evr).
+        :type changes: dict
+        """
+        self.old = old
+        self.new = new
+        self.changes = changes
+
+    @classmethod
+    def between(cls, old, new):
+        """
+        Computes the diff between two package sets.
+
+        :param old: The packages of the older compose.
+        :type old: release_dashboard.checks.compose_diff.PackageSet
+        :param new: The packages of the newer compose.
+        :type new: release_dashboard.checks.compose_diff.PackageSet
+        :rtype: release_dashboard.checks.compose_diff.PackageDiff
+        """
+        changes = {}
+        for key, evr in new:
+            old_evr = old.get(key)
+            if old_evr != evr:
+                changes[key] = (old_evr, evr)
+        for key, evr in old:
+            if new.get(key) is None:
+                changes[key] = (evr, None)
+        return cls(old.version, new.version, changes)
+
+    @classmethod
+    def combine(cls, diffs):
+        """
+        Folds consecutive diffs into the net diff of the whole range.
+
+        :param diffs: Diffs in compose order.
+        :type diffs: list
+        :rtype: release_dashboard.checks.compose_diff.PackageDiff
+        """
+        net = {}
+        for diff in diffs:
+            for key, (old_evr, new_evr) in diff.changes.items():
+                first = net[key][0] if key in net else old_evr
+                net[key] = (first, new_evr)
+        changes = {k: v for k, v in net.items() if v[0] != v[1]}
+        if not diffs:
+            return cls(None, None, changes)
+        return cls(diffs[0].old, diffs[-1].new, changes)
+
+    def _select(self, test):
+        return sorted(
+            (key, old_evr, new_evr)
+            for key, (old_evr, new_evr) in self.changes.items()
+            if test(old_evr, new_evr))
+
+    @property
+    def added(self):
+        """
+        Property listing ((name, arch), evr) of added packages.
+        """
+        return [(k, n) for k, _, n in self._select(lambda o, n: o is None)]
+
+    @property
+    def removed(self):
+        """
+        Property listing ((name, arch), evr) of removed packages.
+        """
+        return [(k, o) for k, o, _ in self._select(lambda o, n: n is None)]
+
+    @property
+    def upgraded(self):
+        """
+        Property listing ((name, arch), old evr, new evr) of upgrades.
+        """
+        return self._select(
+            lambda o, n: o and n and evrcmp(o, n) < 0)
+
+    @property
+    def downgraded(self):
+        """
+        Property listing ((name, arch), old evr, new evr) of downgrades.
+        """
+        return self._select(
+            lambda o, n: o and n and evrcmp(o, n) > 0)
+
+    def as_context(self):
+        """
+        Returns the diff as a template context.
+
+        :rtype: dict
+        """
+        def changed(entries):
+            return [{
+                'name': name, 'arch': arch,
+                'old': format_evr(old_evr), 'new': format_evr(new_evr),
+            } for (name, arch), old_evr, new_evr in entries]
+
+        def single(entries):
+            return [{
+                'name': name, 'arch': arch, 'evr': format_evr(evr),
+            } for (name, arch), evr in entries]
+
+        return {
+            'old': self.old,
+            'new': self.new,
+            'added': single(self.added),
+            'removed': single(self.removed),
+            'upgraded': changed(self.upgraded),
+            'downgraded': changed(self.downgraded),
+        }
+
+
+class ComposeDiffer:
+    """
+    Computes package changes between Fedora-Atomic composes.
+
+    Example::
+
+       differ = ComposeDiffer()
+       diff = differ.range_diff(
+           'Fedora-Atomic-27-20180201.0', 'Fedora-Atomic-27-20180301.0')
+       tracker.create_templatized_issue(
+           'Changes', 'compose_diff.txt', diff.as_context())
+    """
+
+    def __init__(self, check=None, rpms_endpoint_tpl=None,
+                 max_package_sets=4, session=None, logger=None):
+        """
+        Initializes a new instance of ComposeDiffer.
+
+        :param check: Optional status check providing the version list.
+        :type check: release_dashboard.checks.AtomicStatusCheck
+        :param rpms_endpoint_tpl: Optional template url for rpms.json.
+        :type rpms_endpoint_tpl: str
+        :param max_package_sets: How many package sets to keep in memory.
+        :type max_package_sets: int
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._http = session if session is not None else requests
+        self._check = check if check is not None else AtomicStatusCheck(
+            session=session)
+        self._rpms_endpoint_tpl = (
+            'https://kojipkgs.fedoraproject.org/compose/twoweek/{}/'
+            'compose/metadata/rpms.json')
+        if rpms_endpoint_tpl is not None:
+            self._rpms_endpoint_tpl = rpms_endpoint_tpl
+        self._max_package_sets = max_package_sets
+        self._package_sets = OrderedDict()
+        self._diffs = {}
+        self._available = set()
+        self._missing = set()
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('ComposeDiffer')
+
+    def packages(self, version):
+        """
+        Returns the packages of a compose, or None when they can not be
+        retrieved.
+
+        :param version: Version string of the compose.
+        :type version: str
+        :rtype: release_dashboard.checks.compose_diff.PackageSet
+        """
+        if version in self._package_sets:
+            self._package_sets.move_to_end(version)
+            return self._package_sets[version]
+        url = self._rpms_endpoint_tpl.format(version)
+        self._logger.info('Getting packages from %s', url)
+        resp = self._http.get(url, stream=True)
+        try:
+            if resp.status_code != 200:
+                self._logger.warn(
+                    'Received a non 200 response: %d', resp.status_code)
+                self._missing.add(version)
+                return None
+            packages = PackageSet(version, (
+                nevra for _, _, nevra in iter_rpms(
+                    resp.iter_content(chunk_size=64 * 1024))))
+        finally:
+            resp.close()
+        self._package_sets[version] = packages
+        self._available.add(version)
+        while len(self._package_sets) > self._max_package_sets:
+            self._package_sets.popitem(last=False)
+        return packages
+
+    def diff(self, old, new):
+        """
+        Computes the package changes between two composes.
+
+        :param old: Version string of the older compose.
+        :type old: str
+        :param new: Version string of the newer compose.
+        :type new: str
+        :rtype: release_dashboard.checks.compose_diff.PackageDiff
+        :raises: release_dashboard.checks.compose_diff.ComposeDiffError
+        """
+        if (old, new) not in self._diffs:
+            old_packages = self.packages(old)
+            new_packages = self.packages(new)
+            if old_packages is None or new_packages is None:
+                raise ComposeDiffError(
+                    'No package metadata for {} or {}'.format(old, new))
+            self._diffs[(old, new)] = PackageDiff.between(
+                old_packages, new_packages)
+        return self._diffs[(old, new)]
+
+    def diff_range(self, start, end):
+        """
+        Computes the changes between each consecutive compose from start to
+        end. Composes without package metadata are skipped.
+
+        :param start: Version of the first compose.
+        :type start: release_dashboard.checks.version.ComposeVersion
+        :param end: Version of the last compose.
+        :type end: release_dashboard.checks.version.ComposeVersion
+        :returns: Diffs in compose order
+        :rtype: list
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        start = ComposeVersion.parse(start)
+        end = ComposeVersion.parse(end)
+        versions = VersionList(self._check.versions)
+        versions.sort()
+        diffs = []
+        previous = None
+        for version in versions:
+            if not start <= version <= end or version in self._missing:
+                continue
+            if version not in self._available:
+                if self.packages(version) is None:
+                    continue
+            if previous is not None:
+                diffs.append(self.diff(previous, version))
+            previous = version
+        return diffs
+
+    def range_diff(self, start, end):
+        """
+        Computes the net package changes from start to end.
+
+        :param start: Version string of the first compose.
+        :type start: str
+        :param end: Version string of the last compose.
+        :type end: str
+        :rtype: release_dashboard.checks.compose_diff.PackageDiff
+        """
+        return PackageDiff.combine(self.diff_range(start, end))
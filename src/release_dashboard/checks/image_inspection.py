@@ -0,0 +1,348 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Image inspection running many probes in a single guestfs session.
+"""
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+from functools import cmp_to_key
+
+import guestfs
+
+from release_dashboard.checks.rpmvercmp import evrcmp
+
+
+#: The ostree deployment an image boots into.
+Deployment = namedtuple('Deployment', ['osname', 'path', 'checksum'])
+
+
+class InspectionError(Exception):
+    """
+    Base error for image inspection.
+    """
+    pass
+
+
+class Probe(metaclass=ABCMeta):  # pragma: no cover
+    """
+    A single fact to read from a mounted image.
+    """
+
+    #: Name the result is recorded under.
+    name = None
+
+    @abstractmethod
+    def probe(self, guest, deployment):
+        """
+        Reads the fact from the mounted image.
+
+        :param guest: The launched guestfs handle with the image mounted.
+        :type guest: guestfs.GuestFS
+        :param deployment: The ostree deployment of the image.
+        :type deployment: release_dashboard.checks.image_inspection.Deployment
+        :returns: The fact
+        :rtype: object
+        """
+        pass
+
+
+class OstreeVersionProbe(Probe):
+    """
+    Reads OSTREE_VERSION from the deployment's os-release file.
+    """
+
+    name = 'ostree_version'
+
+    def __init__(self, path='usr/lib/os.release.d/os-release-fedora'):
+        """
+        Initializes a new instance of OstreeVersionProbe.
+
+        :param path: os-release path relative to the deployment.
+        :type path: str
+        """
+        self._path = path
+
+    def probe(self, guest, deployment):
+        data = guest.cat('{}/{}'.format(deployment.path, self._path))
+        return re.findall('OSTREE_VERSION=(.*)', data)[0].strip('"\'')
+
+
+class CommitChecksumProbe(Probe):
+    """
+    Reports the ostree commit checksum of the deployment.
+    """
+
+    name = 'commit'
+
+    def probe(self, guest, deployment):
+        return deployment.checksum
+
+
+class OstreeRefsProbe(Probe):
+    """
+    Lists the refs in the image's ostree repository. Remote refs are
+    reported as remote:ref.
+    """
+
+    name = 'refs'
+
+    def _refs(self, guest, root):
+        if not guest.is_dir(root):
+            return []
+        return [
+            name for name in guest.find(root)
+            if guest.is_file('{}/{}'.format(root, name))]
+
+    def probe(self, guest, deployment):
+        refs = self._refs(guest, '/ostree/repo/refs/heads')
+        for ref in self._refs(guest, '/ostree/repo/refs/remotes'):
+            remote, _, name = ref.partition('/')
+            refs.append('{}:{}'.format(remote, name))
+        return sorted(refs)
+
+
+class KernelVersionProbe(Probe):
+    """
+    Reads the kernel version from the deployment's module directory. When
+    several kernels are installed the newest, by rpm version comparison,
+    is used.
+    """
+
+    name = 'kernel'
+
+    @staticmethod
+    def _compare(a, b):
+        version_a, _, release_a = a.partition('-')
+        version_b, _, release_b = b.partition('-')
+        return evrcmp(('0', version_a, release_a), ('0', version_b, release_b))
+
+    def probe(self, guest, deployment):
+        kernels = guest.ls(deployment.path + '/usr/lib/modules')
+        if not kernels:
+            raise InspectionError('No kernel modules found')
+        return max(kernels, key=cmp_to_key(self._compare))
+
+
+class RpmPackagesProbe(Probe):
+    """
+    Lists the NEVRA of every package in the deployment's rpm database.
+    The database is copied out of the image and queried with the host's rpm.
+    """
+
+    name = 'packages'
+    query_format = '%{NAME}-%{EPOCHNUM}:%{VERSION}-%{RELEASE}.%{ARCH}\\n'
+
+    def __init__(self, dbpath='usr/share/rpm'):
+        """
+        Initializes a new instance of RpmPackagesProbe.
+
+        :param dbpath: rpm database path relative to the deployment.
+        :type dbpath: str
+        """
+        self._dbpath = dbpath
+
+    def probe(self, guest, deployment):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            guest.copy_out(
+                '{}/{}'.format(deployment.path, self._dbpath), tmpdir)
+            output = subprocess.check_output([
+                'rpm', '--dbpath',
+                os.path.join(tmpdir, os.path.basename(self._dbpath)),
+                '-qa', '--qf', self.query_format])
+        finally:
+            shutil.rmtree(tmpdir)
+        return sorted(output.decode('utf8').split())
+
+
+class InspectionResult:
+    """
+    The facts read from an image, keyed by probe name.
+    """
+
+    def __init__(self, image_path, deployment, values, errors):
+        """
+        Initializes a new instance of InspectionResult.
+
+        :param image_path: The inspected image.
+        :type image_path: str
+        :param deployment: The ostree deployment that was inspected.
+        :type deployment: release_dashboard.checks.image_inspection.Deployment
+        :param values: Facts by probe name.
+        :type values: dict
+        :param errors: Error messages by name of the probes that failed.
+        :type errors: dict
+        """
+        self.image_path = image_path
+        self.deployment = deployment
+        self.values = values
+        self.errors = errors
+
+    def __getitem__(self, name):
+        """
+        Returns the fact a probe found.
+
+        :raises: release_dashboard.checks.image_inspection.InspectionError
+        """
+        if name in self.errors:
+            raise InspectionError(
+                'Probe {} failed: {}'.format(name, self.errors[name]))
+        try:
+            return self.values[name]
+        except KeyError:
+            raise InspectionError('Probe {} was not run'.format(name))
+
+    def as_dict(self):
+        """
+        Returns the result as a plain dictionary.
+
+        :rtype: dict
+        """
+        return {
+            'image_path': self.image_path,
+            'deployment': dict(self.deployment._asdict()),
+            'values': dict(self.values),
+            'errors': dict(self.errors),
+        }
+
+
+class ImageInspector:
+    """
+    Runs registered probes against an image in one guestfs session. Facts
+    are remembered, so the image is only launched again when a probe that
+    has not run yet is asked for.
+
+    Example::
+
+       inspector = ImageInspector('/tmp/image.qcow2')
+       inspector.register(OstreeVersionProbe(), KernelVersionProbe())
+       result = inspector.inspect()
+       print(result['ostree_version'], result['kernel'])
+    """
+
+    def __init__(self, image_path, osname='fedora-atomic',
+                 root_device='/dev/atomicos/root', image_format='qcow2',
+                 logger=None):
+        """
+        Initializes a new instance of ImageInspector.
+
+        :param image_path: Path to the image to inspect.
+        :type image_path: str
+        :param osname: The ostree osname of the deployment.
+        :type osname: str
+        :param root_device: Device holding the ostree sysroot.
+        :type root_device: str
+        :param image_format: Disk format of the image.
+        :type image_format: str
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._image_path = image_path
+        self._osname = osname
+        self._root_device = root_device
+        self._image_format = image_format
+        self._probes = {}
+        self._deployment = None
+        self._values = {}
+        self._errors = {}
+        self.launches = 0
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('ImageInspector')
+
+    def register(self, *probes):
+        """
+        Registers probes to run on the next inspection.
+
+        :param probes: The probes to register.
+        :type probes: release_dashboard.checks.image_inspection.Probe
+        """
+        for probe in probes:
+            self._probes[probe.name] = probe
+
+    def inspect(self, probes=None):
+        """
+        Inspects the image with the given or all registered probes.
+
+        :param probes: Optional probes to run instead of the registered ones.
+        :type probes: list
+        :returns: The facts found by the probes
+        :rtype: release_dashboard.checks.image_inspection.InspectionResult
+        :raises: release_dashboard.checks.image_inspection.InspectionError
+        """
+        if probes is not None:
+            self.register(*probes)
+            names = [probe.name for probe in probes]
+        else:
+            names = list(self._probes)
+        missing = [
+            self._probes[name] for name in names
+            if name not in self._values and name not in self._errors]
+        if missing or self._deployment is None:
+            self._run(missing)
+        return InspectionResult(
+            self._image_path, self._deployment,
+            {n: self._values[n] for n in names if n in self._values},
+            {n: self._errors[n] for n in names if n in self._errors})
+
+    def _find_deployment(self, guest):
+        """
+        Finds the deployment the image boots into.
+        """
+        root = '/ostree/deploy/{}/deploy/'.format(self._osname)
+        name = [x for x in guest.ls(root) if not x.endswith('.origin')][0]
+        return Deployment(
+            self._osname, root + name, name.split('.')[0])
+
+    def _run(self, probes):
+        """
+        Launches the image once and runs all given probes.
+        """
+        self._logger.info(
+            'Inspecting %s with %s', self._image_path,
+            ', '.join(p.name for p in probes) or 'no probes')
+        guest = guestfs.GuestFS(python_return_dict=True)
+        try:
+            guest.add_drive_opts(
+                self._image_path, format=self._image_format, readonly=1)
+            guest.launch()
+            self.launches += 1
+            guest.mount(self._root_device, '/')
+            self._deployment = self._find_deployment(guest)
+            for probe in probes:
+                try:
+                    self._values[probe.name] = probe.probe(
+                        guest, self._deployment)
+                except Exception as err:
+                    self._logger.warning(
+                        'Probe %s failed: %s', probe.name, err)
+                    self._errors[probe.name] = '{}: {}'.format(
+                        type(err).__name__, err)
+            guest.shutdown()
+        except Exception as err:
+            raise InspectionError(
+                'Unable to inspect {}: {}: {}'.format(
+                    self._image_path, type(err).__name__, err))
+        finally:
+            guest.close()
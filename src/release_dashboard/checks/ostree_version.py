@@ -15,12 +15,14 @@
 
 
 import os
-import re
 import tempfile
 
-import guestfs
 import requests
 
+from release_dashboard.checks import IMAGE_URL_TPL, download
+from release_dashboard.checks.image_inspection import (
+    ImageInspector, OstreeVersionProbe)
+
 
 class OstreeVersionSniffer:
     """
@@ -36,16 +38,29 @@ class OstreeVersionSniffer:
        o = OstreeVersionSniffer('Fedora-Atomic-27-20180216.0')
        print(o.get_ostree_version())
        o.clean_up()
+
+    Example::
+
+       with OstreeVersionSniffer('Fedora-Atomic-27-20180216.0') as o:
+           result = o.inspect([OstreeVersionProbe(), KernelVersionProbe()])
+           print(result['ostree_version'], result['kernel'])
     """
 
-    def __init__(self, version):
+    def __init__(self, version, osname='fedora-atomic', session=None):
         """
         Initialize a new instance of OstreeVersionSniffer.
 
         :param version: The version to inspect.
         :type version: str
+        :param osname: The ostree osname of the image's deployment.
+        :type osname: str
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
         """
+        self._http = session if session is not None else requests
         self._image_path = None
+        self._inspector = None
+        self._osname = osname
         self._version = version
 
     def __enter__(self):  # pragma: no cover
@@ -65,18 +80,26 @@ class OstreeVersionSniffer:
         :type url: str
         """
         if url is None:
-            url = ("https://kojipkgs.fedoraproject.org/compose/twoweek/{}/"
-                   "compose/CloudImages/x86_64/images/{}.x86_64.qcow2").format(
-                       version, version)
+            url = IMAGE_URL_TPL.format(version)
         _, self._image_path = tempfile.mkstemp()
-        r = requests.get(url, stream=True)
-        if r.status_code != 200:
-            raise Exception(
-                'Non 200 result getting install.img: {}'.format(r.status_code))
-        with open(self._image_path, 'wb') as fobj:
-            for chunk in r.iter_content(chunk_size=1024):
-                if chunk:
-                    fobj.write(chunk)
+        self._inspector = None
+        download(url, self._image_path, session=self._http)
+
+    def inspect(self, probes):
+        """
+        Runs probes against the downloaded image. Probes which already ran
+        for this image are answered without launching it again.
+
+        :param probes: The probes to run.
+        :type probes: list
+        :returns: The facts found by the probes
+        :rtype: release_dashboard.checks.image_inspection.InspectionResult
+        :raises: release_dashboard.checks.image_inspection.InspectionError
+        """
+        if self._inspector is None:
+            self._inspector = ImageInspector(
+                self._image_path, osname=self._osname)
+        return self._inspector.inspect(probes)
 
     def get_ostree_version(self):
         """
@@ -86,18 +109,7 @@ class OstreeVersionSniffer:
         :rtype: str
         """
         try:
-            g = guestfs.GuestFS(python_return_dict=True)
-            g.add_drive_opts(self._image_path, format="qcow2", readonly=0)
-            g.launch()
-            g.mount('/dev/atomicos/root', '/')
-            dir = g.ls('/ostree/deploy/fedora-atomic/deploy/')[0]
-            data = g.cat(
-                '/ostree/deploy/fedora-atomic/deploy/'
-                '{}/usr/lib/os.release.d/os-release-fedora'.format(dir))
-            print(type(data), data)
-            version = re.findall("OSTREE_VERSION=(.*)", data)[0]
-            g.shutdown()
-            return version
+            return self.inspect([OstreeVersionProbe()])['ostree_version']
         except Exception as ex:
             raise Exception(
                 'Unable to read ostree version: {}: {}'.format(type(ex), ex))
@@ -108,6 +120,7 @@ class OstreeVersionSniffer:
         """
         if self._image_path:
             os.unlink(self._image_path)
+        self._inspector = None
 
     def __exit__(self, type, value, traceback):  # pragma: no cover
         """
@@ -0,0 +1,81 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Version comparison following rpm's rules.
+"""
+
+import re
+
+
+_SEGMENT_RE = re.compile(r'~|\^|\d+|[a-zA-Z]+')
+
+
+def _segment_cmp(a, b):
+    """
+    Compares two non tilde, non caret version segments like rpm does.
+    """
+    if a.isdigit() != b.isdigit():
+        return 1 if a.isdigit() else -1
+    if a.isdigit():
+        a, b = int(a), int(b)
+    return (a > b) - (a < b)
+
+
+def vercmp(a, b):
+    """
+    Compares two version or release strings following rpm's rules.
+
+    :param a: The first version.
+    :type a: str
+    :param b: The second version.
+    :type b: str
+    :returns: -1, 0 or 1 if a is older, equal or newer than b
+    :rtype: int
+    """
+    if a == b:
+        return 0
+    sa, sb = _SEGMENT_RE.findall(a), _SEGMENT_RE.findall(b)
+    for x, y in zip(sa + [None] * len(sb), sb + [None] * len(sa)):
+        if x == y:
+            if x is None:
+                return 0
+            continue
+        if '~' in (x, y):
+            # Tilde sorts before everything, even the end of the version
+            return -1 if x == '~' else 1
+        if '^' in (x, y):
+            # Caret sorts after the end of the version but before the rest
+            if None in (x, y):
+                return 1 if x == '^' else -1
+            return -1 if x == '^' else 1
+        if None in (x, y):
+            return -1 if x is None else 1
+        result = _segment_cmp(x, y)
+        if result:
+            return result
+    return 0
+
+
+def evrcmp(a, b):
+    """
+    Compares two (epoch, version, release) tuples.
+
+    :returns: -1, 0 or 1 if a is older, equal or newer than b
+    :rtype: int
+    """
+    epoch_a, epoch_b = int(a[0]), int(b[0])
+    if epoch_a != epoch_b:
+        return -1 if epoch_a < epoch_b else 1
+    return vercmp(a[1], b[1]) or vercmp(a[2], b[2])
@@ -0,0 +1,310 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Parsed compose versions.
+"""
+
+import re
+import sys
+
+from array import array
+from bisect import bisect_left
+
+
+_VERSION_RE = re.compile(
+    r'^(?P<name>.+)-(?P<release>[^-]+)-(?P<date>\d{8})'
+    r'\.(?P<respin>0|[1-9]\d{0,3})$')
+
+
+class VersionError(ValueError):
+    """
+    Raised when a string is not a compose version.
+    """
+    pass
+
+
+def _release_key(release):
+    """
+    Sorts numbered releases numerically and before named ones like Rawhide.
+    """
+    if release.isdigit():
+        return (0, int(release), '')
+    return (1, 0, release)
+
+
+class ComposeVersion:
+    """
+    A compose version such as Fedora-Atomic-27-20180213.0, split into its
+    name (Fedora-Atomic), release (27), date (20180213) and respin (0).
+
+    Versions sort by name, release, date and respin, and compare and hash
+    equal to their string form, so they can be looked up with plain
+    strings.
+
+    Example::
+
+       version = ComposeVersion.parse('Fedora-Atomic-27-20180213.0')
+       print(version.release, version.pungi_id)
+    """
+
+    __slots__ = ('name', 'release', 'date', 'respin')
+
+    def __init__(self, name, release, date, respin):
+        """
+        Initializes a new instance of ComposeVersion.
+
+        :param name: Name of the compose, for example Fedora-Atomic.
+        :type name: str
+        :param release: The release, for example 27 or Rawhide.
+        :type release: str
+        :param date: The compose date as YYYYMMDD.
+        :type date: int
+        :param respin: The respin of the compose on that date.
+        :type respin: int
+        """
+        self.name = sys.intern(name)
+        self.release = sys.intern(release)
+        self.date = int(date)
+        self.respin = int(respin)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parses a version string. Versions are returned as they are.
+
+        :param text: The version string.
+        :type text: str
+        :rtype: release_dashboard.checks.version.ComposeVersion
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        if isinstance(text, cls):
+            return text
+        match = _VERSION_RE.match(text) if isinstance(text, str) else None
+        if match is None:
+            raise VersionError('Not a compose version: {!r}'.format(text))
+        return cls(*match.groups())
+
+    @property
+    def pungi_id(self):
+        """
+        Property that returns the date and respin, for example 20180213.0.
+        """
+        return '{}.{}'.format(self.date, self.respin)
+
+    @property
+    def sort_key(self):
+        """
+        Property that returns the tuple versions are ordered by.
+        """
+        return (self.name, _release_key(self.release), self.date,
+                self.respin)
+
+    def __str__(self):
+        return '{}-{}-{}.{}'.format(
+            self.name, self.release, self.date, self.respin)
+
+    def __repr__(self):
+        return 'ComposeVersion({!r})'.format(str(self))
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, ComposeVersion):
+            mine = (self.date, self.respin, self.release, self.name)
+            return mine == (
+                other.date, other.respin, other.release, other.name)
+        if isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    def _other_key(self, other):
+        try:
+            return ComposeVersion.parse(other).sort_key
+        except VersionError:
+            return None
+
+    def __lt__(self, other):
+        key = self._other_key(other)
+        return NotImplemented if key is None else self.sort_key < key
+
+    def __le__(self, other):
+        key = self._other_key(other)
+        return NotImplemented if key is None else self.sort_key <= key
+
+    def __gt__(self, other):
+        key = self._other_key(other)
+        return NotImplemented if key is None else self.sort_key > key
+
+    def __ge__(self, other):
+        key = self._other_key(other)
+        return NotImplemented if key is None else self.sort_key >= key
+
+    def __conform__(self, protocol):
+        """
+        Stores versions as their string form in sqlite3.
+        """
+        return str(self)
+
+
+class VersionList:
+    """
+    A compact list of compose versions. Versions are kept in array columns
+    of date, respin and an index into a table of distinct (name, release)
+    series, which takes eight bytes per version instead of a string
+    and a list slot. Membership tests bisect a sorted array of packed
+    keys, built on the first test, which adds another eight bytes per
+    version.
+
+    Example::
+
+       versions = VersionList(check.get_versions())
+       versions.sort()
+       print(versions[-1], 'Fedora-Atomic-27-20180213.0' in versions)
+    """
+
+    def __init__(self, versions=()):
+        """
+        Initializes a new instance of VersionList.
+
+        :param versions: Optional versions or version strings to add.
+        :type versions: iterable
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        self._series = []
+        self._series_ids = {}
+        self._series_col = array('H')
+        self._date_col = array('I')
+        self._respin_col = array('H')
+        self._lookup = None
+        self.extend(versions)
+
+    def append(self, version):
+        """
+        Adds a version to the end of the list.
+
+        :param version: The version or version string to add.
+        :type version: release_dashboard.checks.version.ComposeVersion
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        version = ComposeVersion.parse(version)
+        series = (version.name, version.release)
+        series_id = self._series_ids.get(series)
+        if series_id is None:
+            series_id = self._series_ids[series] = len(self._series)
+            self._series.append(series)
+        self._series_col.append(series_id)
+        self._date_col.append(version.date)
+        self._respin_col.append(version.respin)
+        self._lookup = None
+
+    def extend(self, versions):
+        """
+        Adds versions to the end of the list.
+
+        :param versions: The versions or version strings to add.
+        :type versions: iterable
+        :raises: release_dashboard.checks.version.VersionError
+        """
+        for version in versions:
+            self.append(version)
+
+    @staticmethod
+    def _packed(series_id, date, respin):
+        return (series_id << 48) | (date << 16) | respin
+
+    def sort(self, reverse=False):
+        """
+        Sorts the list in place, oldest first unless reverse is given.
+
+        :param reverse: Sort newest first.
+        :type reverse: bool
+        """
+        ranks = [0] * len(self._series)
+        by_key = sorted(
+            range(len(self._series)),
+            key=lambda i: (self._series[i][0],
+                           _release_key(self._series[i][1])))
+        for rank, series_id in enumerate(by_key):
+            ranks[series_id] = rank
+        # Sorting plain integers is much faster than sorting tuples
+        keys = [self._packed(ranks[s], d, r) for s, d, r in zip(
+            self._series_col, self._date_col, self._respin_col)]
+        order = sorted(range(len(keys)), key=keys.__getitem__,
+                       reverse=reverse)
+        self._series_col = array('H', [self._series_col[i] for i in order])
+        self._date_col = array('I', [self._date_col[i] for i in order])
+        self._respin_col = array('H', [self._respin_col[i] for i in order])
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the version columns and the membership keys.
+
+        :rtype: int
+        """
+        columns = [self._series_col, self._date_col, self._respin_col]
+        if self._lookup is not None:
+            columns.append(self._lookup)
+        return sum(col.itemsize * len(col) for col in columns)
+
+    def _version(self, index):
+        name, release = self._series[self._series_col[index]]
+        return ComposeVersion(
+            name, release, self._date_col[index], self._respin_col[index])
+
+    def __len__(self):
+        return len(self._date_col)
+
+    def __iter__(self):
+        for series_id, date, respin in zip(
+                self._series_col, self._date_col, self._respin_col):
+            name, release = self._series[series_id]
+            yield ComposeVersion(name, release, date, respin)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return VersionList(
+                self._version(i) for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('VersionList index out of range')
+        return self._version(index)
+
+    def __contains__(self, version):
+        try:
+            version = ComposeVersion.parse(version)
+        except VersionError:
+            return False
+        series_id = self._series_ids.get((version.name, version.release))
+        if series_id is None:
+            return False
+        if self._lookup is None:
+            self._lookup = array('Q', sorted(
+                self._packed(s, d, r) for s, d, r in zip(
+                    self._series_col, self._date_col, self._respin_col)))
+        key = self._packed(series_id, version.date, version.respin)
+        index = bisect_left(self._lookup, key)
+        return index < len(self._lookup) and self._lookup[index] == key
+
+    def __eq__(self, other):
+        if not isinstance(other, (VersionList, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return 'VersionList({!r})'.format([str(v) for v in self])
@@ -15,3 +15,207 @@
 """
 CLI classes and methods.
 """
+
+import argparse
+import json
+import logging
+import sys
+
+from release_dashboard import transport
+from release_dashboard.backfill import ArchiveIndex, Backfill, BackfillStore
+from release_dashboard.checks import (
+    AtomicStatusCheck, IMAGE_PATH_TPL, TWOWEEK_URL)
+from release_dashboard.coordination import (
+    Worker, compose_handlers, schedule_composes)
+from release_dashboard.coordination.sqlite import SQLiteLeaseBackend
+from release_dashboard.notifications import Dispatcher
+from release_dashboard.notifications.webhook import WebhookChannel
+
+
+def make_session(args):
+    """
+    Creates the session all requests are sent with.
+
+    :param args: Parsed command line arguments.
+    :type args: argparse.Namespace
+    :returns: A recording or replaying session, or None for the default
+    :rtype: requests.Session
+    """
+    if args.replay:
+        return transport.replay_session(args.replay, speed=args.replay_speed)
+    if args.record:
+        return transport.recording_session(args.record)
+    return None
+
+
+def backfill(args):
+    """
+    Backfills the history of all composes into a SQLite database.
+
+    :param args: Parsed command line arguments.
+    :type args: argparse.Namespace
+    :returns: Exit code
+    :rtype: int
+    """
+    index = ArchiveIndex(
+        args.index, max_depth=args.depth, session=args.session)
+    store = BackfillStore(args.database, checkpoint_every=args.checkpoint)
+    try:
+        Backfill(
+            store, index=index, workers=args.workers, rate=args.rate,
+            sniff_ostree=args.ostree, status_path=args.status_path,
+            image_path_tpl=args.image_path, session=args.session).run()
+    except KeyboardInterrupt:
+        print('Interrupted. Rerun to resume.', file=sys.stderr)
+        return 130
+    finally:
+        store.close()
+    return 0
+
+
+def worker(args):
+    """
+    Runs a worker sharing compose checks with other nodes.
+
+    :param args: Parsed command line arguments.
+    :type args: argparse.Namespace
+    :returns: Exit code
+    :rtype: int
+    """
+    check = AtomicStatusCheck(
+        version_endpoint=args.index, session=args.session)
+    backend = SQLiteLeaseBackend(args.database)
+    kinds = args.kinds or ['compose-status']
+    dispatcher = Dispatcher([
+        WebhookChannel(url, session=args.session) for url in args.webhooks])
+    dispatcher.start()
+    try:
+        if args.schedule:
+            schedule_composes(backend, check, kinds=kinds)
+        handlers = {
+            kind: handler
+            for kind, handler in compose_handlers(
+                check, session=args.session, dispatcher=dispatcher,
+                backend=backend).items()
+            if kind in kinds}
+        Worker(backend, handlers, ttl=args.ttl).run(
+            exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        dispatcher.stop()
+        backend.close()
+    return 0
+
+
+def load(args):
+    """
+    Replays a recorded archive against a live deployment at concurrency.
+
+    :param args: Parsed command line arguments.
+    :type args: argparse.Namespace
+    :returns: Exit code
+    :rtype: int
+    """
+    rewrite = None
+    if args.base_url:
+        rewrite = (args.recorded_url, args.base_url)
+    stats = transport.LoadReplayer(
+        args.archive, concurrency=args.concurrency, repeat=args.repeat,
+        rewrite=rewrite).run()
+    print(json.dumps(stats, indent=2, sort_keys=True))
+    return 1 if stats['errors'] else 0
+
+
+def build_parser():
+    """
+    Builds the command line parser.
+
+    :returns: The parser for all sub commands
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog='release-dashboard')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true', help='Log debug output')
+    parser.add_argument(
+        '--record', metavar='ARCHIVE', help='Record all HTTP to ARCHIVE')
+    parser.add_argument(
+        '--replay', metavar='ARCHIVE', help='Answer HTTP from ARCHIVE')
+    parser.add_argument(
+        '--replay-speed', type=float, metavar='SPEED',
+        help='Replay with recorded timings divided by SPEED. '
+             'Default: full speed')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    cmd = commands.add_parser(
+        'backfill', help='Record the history of all archived composes')
+    cmd.add_argument('database', help='SQLite database to write to')
+    cmd.add_argument('--index', default=TWOWEEK_URL,
+                     help='Url of the compose archive. Default: %(default)s')
+    cmd.add_argument('--depth', type=int, default=1,
+                     help='Levels of subdirectories to search for composes. '
+                          'Default: 1')
+    cmd.add_argument('--status-path', default='STATUS',
+                     help='STATUS path within a compose. Default: %(default)s')
+    cmd.add_argument('--image-path', default=IMAGE_PATH_TPL,
+                     help='Image path within a compose, {0} is the version. '
+                          'Default: %(default)s')
+    cmd.add_argument('--workers', type=int, default=4,
+                     help='Composes processed at once. Default: 4')
+    cmd.add_argument('--rate', type=float, default=2.0,
+                     help='Maximum requests per second. Default: 2')
+    cmd.add_argument('--checkpoint', type=int, default=50,
+                     help='Records between checkpoints. Default: 50')
+    cmd.add_argument('--ostree', action='store_true',
+                     help='Download finished images for the ostree version')
+    cmd.set_defaults(func=backfill)
+
+    cmd = commands.add_parser(
+        'worker', help='Share compose checks with workers on other nodes')
+    cmd.add_argument('database', help='SQLite database shared by workers')
+    cmd.add_argument('--index', help='Override the compose index url')
+    cmd.add_argument(
+        '--kind', dest='kinds', action='append',
+        choices=['compose-status', 'ostree-version'],
+        help='Kind of work to do. Repeatable. Default: compose-status')
+    cmd.add_argument('--schedule', action='store_true',
+                     help='Enqueue work for all composes in the index first')
+    cmd.add_argument('--ttl', type=float, default=60,
+                     help='Seconds a claim lasts between renewals')
+    cmd.add_argument('--exit-when-idle', action='store_true',
+                     help='Exit once there is no work left')
+    cmd.add_argument('--webhook', dest='webhooks', action='append',
+                     default=[], metavar='URL',
+                     help='Post compose status changes here. Repeatable')
+    cmd.set_defaults(func=worker)
+
+    cmd = commands.add_parser(
+        'load', help='Replay a recorded archive against a live deployment')
+    cmd.add_argument('archive', help='Archive recorded with --record')
+    cmd.add_argument('--concurrency', type=int, default=8,
+                     help='Concurrent clients. Default: 8')
+    cmd.add_argument('--repeat', type=int, default=1,
+                     help='Times to send the whole archive. Default: 1')
+    cmd.add_argument('--base-url', help='Send requests here instead')
+    cmd.add_argument(
+        '--recorded-url', default='https://kojipkgs.fedoraproject.org',
+        help='Url prefix replaced by --base-url. Default: %(default)s')
+    cmd.set_defaults(func=load)
+    return parser
+
+
+def main(argv=None):  # pragma: no cover
+    """
+    Entry point of the release-dashboard command.
+    """
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO)
+    args.session = make_session(args)
+    try:
+        code = args.func(args)
+    finally:
+        if args.session is not None:
+            args.session.close()
+    sys.exit(code)
@@ -0,0 +1,388 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Coordination of work between dashboard workers on many nodes.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+
+from release_dashboard.checks import (
+    TERMINAL_STATUSES, ostree_version_sniffer)
+from release_dashboard.notifications import compose_event
+
+
+#: A claim on a task, valid until expires unless renewed.
+Lease = namedtuple(
+    'Lease', ['kind', 'key', 'payload', 'token', 'worker', 'expires',
+              'attempts'])
+
+#: Results after which a task of a kind never needs to run again. Tasks of
+#: other kinds are finished once they completed.
+FINAL_RESULTS = {
+    'compose-status': TERMINAL_STATUSES,
+}
+
+
+class CoordinationError(Exception):
+    """
+    Base error for coordination.
+    """
+    pass
+
+
+class LeaseLost(CoordinationError):
+    """
+    The lease expired and the task may now belong to another worker.
+    """
+    pass
+
+
+class LeaseBackend(metaclass=ABCMeta):  # pragma: no cover
+    """
+    Shared storage handing out tasks through expiring leases.
+    """
+
+    @abstractmethod
+    def enqueue(self, kind, key, payload=None):
+        """
+        Adds a task unless a task of the same kind and key exists.
+
+        :param kind: The kind of work, for example compose-status.
+        :type kind: str
+        :param key: What to work on, for example a compose version.
+        :type key: str
+        :param payload: Optional JSON serializable handler input.
+        :type payload: object
+        :returns: True if the task was added
+        :rtype: bool
+        """
+        pass
+
+    @abstractmethod
+    def requeue(self, kind, key, keep=()):
+        """
+        Sets a done task back to pending unless its result is in keep.
+
+        :param kind: The kind of work.
+        :type kind: str
+        :param key: What was worked on.
+        :type key: str
+        :param keep: Results which are final and are not run again.
+        :type keep: iterable
+        :returns: True if the task was set back to pending
+        :rtype: bool
+        """
+        pass
+
+    @abstractmethod
+    def claim(self, worker, kinds=None, ttl=60):
+        """
+        Claims the next pending task or one whose lease expired.
+
+        :param worker: Identifier of the claiming worker.
+        :type worker: str
+        :param kinds: Optional kinds of work to restrict claims to.
+        :type kinds: list
+        :param ttl: Seconds the lease is valid for.
+        :type ttl: float
+        :returns: The lease or None when there is nothing to do
+        :rtype: release_dashboard.coordination.Lease
+        """
+        pass
+
+    @abstractmethod
+    def renew(self, lease, ttl=60):
+        """
+        Extends a lease.
+
+        :param lease: The lease to extend.
+        :type lease: release_dashboard.coordination.Lease
+        :param ttl: Seconds from now the lease is valid for.
+        :type ttl: float
+        :returns: The extended lease
+        :rtype: release_dashboard.coordination.Lease
+        :raises: release_dashboard.coordination.LeaseLost
+        """
+        pass
+
+    @abstractmethod
+    def complete(self, lease, result=None):
+        """
+        Marks the task of a lease as done.
+
+        :param lease: The lease of the finished task.
+        :type lease: release_dashboard.coordination.Lease
+        :param result: Optional JSON serializable result.
+        :type result: object
+        :raises: release_dashboard.coordination.LeaseLost
+        """
+        pass
+
+    @abstractmethod
+    def fail(self, lease, error):
+        """
+        Releases a lease after an error so the task can be retried, or
+        marks it failed once it ran out of attempts.
+
+        :param lease: The lease of the failed task.
+        :type lease: release_dashboard.coordination.Lease
+        :param error: Description of the error.
+        :type error: str
+        :raises: release_dashboard.coordination.LeaseLost
+        """
+        pass
+
+    @abstractmethod
+    def result(self, kind, key):
+        """
+        Returns the state and result of a task.
+
+        :param kind: The kind of work.
+        :type kind: str
+        :param key: What was worked on.
+        :type key: str
+        :returns: Tuple of (state, result) or None for unknown tasks
+        :rtype: tuple
+        """
+        pass
+
+
+def default_worker_id():
+    """
+    Returns an identifier unique to this process on this node.
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+class Worker:
+    """
+    Claims tasks from a backend and runs the handler for their kind. The
+    lease is renewed in the background while the handler runs, so only a
+    crashed worker's tasks are handed to another worker. Failed renewals
+    are retried until the lease runs out.
+
+    Example::
+
+       backend = SQLiteLeaseBackend('/srv/dashboard/work.sqlite')
+       Worker(backend, compose_handlers()).run()
+    """
+
+    def __init__(self, backend, handlers, worker_id=None, ttl=60,
+                 poll_interval=5.0, clock=time.time, logger=None):
+        """
+        Initializes a new instance of Worker.
+
+        :param backend: Where tasks are claimed from.
+        :type backend: release_dashboard.coordination.LeaseBackend
+        :param handlers: Mapping of kind to callable(key, payload).
+        :type handlers: dict
+        :param worker_id: Optional identifier. Default: host:pid.
+        :type worker_id: str
+        :param ttl: Seconds a lease is valid between renewals.
+        :type ttl: float
+        :param poll_interval: Seconds to wait when there is nothing to do.
+        :type poll_interval: float
+        :param clock: Wall clock the backend's leases expire by.
+        :type clock: callable
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._backend = backend
+        self._handlers = handlers
+        self.worker_id = worker_id or default_worker_id()
+        self._ttl = ttl
+        self._poll_interval = poll_interval
+        self._clock = clock
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('Worker')
+
+    def _heartbeat(self, lease, stop, lost):
+        """
+        Renews a lease until stopped or the lease is lost. A renewal which
+        fails is retried sooner, until the lease expired.
+        """
+        interval = self._ttl / 3.0
+        while not stop.wait(interval):
+            try:
+                lease = self._backend.renew(lease, self._ttl)
+                interval = self._ttl / 3.0
+            except LeaseLost:
+                lost.set()
+                return
+            except Exception as err:
+                self._logger.warning(
+                    'Renewing lease on %s %s failed: %s',
+                    lease.kind, lease.key, err)
+                if self._clock() >= lease.expires:
+                    lost.set()
+                    return
+                interval = self._ttl / 10.0
+
+    def run_once(self):
+        """
+        Claims and handles a single task.
+
+        :returns: True if a task was handled, False if there was none
+        :rtype: bool
+        """
+        lease = self._backend.claim(
+            self.worker_id, list(self._handlers), self._ttl)
+        if lease is None:
+            return False
+        self._logger.info('Claimed %s %s', lease.kind, lease.key)
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(lease, stop, lost), daemon=True)
+        heartbeat.start()
+        try:
+            result = self._handlers[lease.kind](lease.key, lease.payload)
+        except Exception as err:
+            stop.set()
+            heartbeat.join()
+            self._logger.warning(
+                'Failed %s %s: %s', lease.kind, lease.key, err)
+            self._finish(self._backend.fail, lease, '{}: {}'.format(
+                type(err).__name__, err))
+            return True
+        stop.set()
+        heartbeat.join()
+        if not lost.is_set():
+            self._finish(self._backend.complete, lease, result)
+        return True
+
+    def _finish(self, func, lease, value):
+        try:
+            func(lease, value)
+        except LeaseLost:
+            self._logger.warning(
+                'Lease on %s %s was lost', lease.kind, lease.key)
+
+    def run(self, stop=None, exit_when_idle=False):
+        """
+        Handles tasks until stopped.
+
+        :param stop: Optional event which stops the worker when set.
+        :type stop: threading.Event
+        :param exit_when_idle: Return once there is nothing left to claim.
+        :type exit_when_idle: bool
+        :returns: The number of tasks handled
+        :rtype: int
+        """
+        stop = stop or threading.Event()
+        handled = 0
+        while not stop.is_set():
+            if self.run_once():
+                handled += 1
+            elif exit_when_idle:
+                break
+            else:
+                stop.wait(self._poll_interval)
+        return handled
+
+
+def _status_changed(previous, status):
+    """
+    Tells whether a compose status is worth a notification. A compose seen
+    for the first time in a terminal status finished before it was watched
+    and is left alone.
+    """
+    if status is None or status == previous:
+        return False
+    return previous is not None or status not in TERMINAL_STATUSES
+
+
+def compose_handlers(check=None, session=None, dispatcher=None,
+                     backend=None):
+    """
+    Returns the handlers for compose work.
+
+    compose-status reads the STATUS of a compose and ostree-version
+    downloads a compose's image to read its ostree version. With a
+    dispatcher, compose-status sends an event when a compose shows up or
+    its status differs from the result of the previous run stored in the
+    backend, whichever worker that ran on.
+
+    :param check: Optional status check to use.
+    :type check: release_dashboard.checks.AtomicStatusCheck
+    :param session: Optional session to send requests with.
+    :type session: requests.Session
+    :param dispatcher: Optional dispatcher to send status changes to.
+    :type dispatcher: release_dashboard.notifications.Dispatcher
+    :param backend: Backend the tasks are claimed from. Required with a
+        dispatcher.
+    :type backend: release_dashboard.coordination.LeaseBackend
+    :returns: Mapping of kind to handler
+    :rtype: dict
+    :raises: release_dashboard.coordination.CoordinationError
+    """
+    if dispatcher is not None and backend is None:
+        raise CoordinationError(
+            'Notifying status changes needs the backend of the tasks')
+    if check is None:
+        from release_dashboard.checks import AtomicStatusCheck
+        check = AtomicStatusCheck(session=session)
+
+    def compose_status(key, payload):
+        status = check.get_compose_status(key)
+        if dispatcher is not None:
+            # The previous result is kept until this run completes
+            previous = backend.result('compose-status', key)
+            if _status_changed(previous and previous[1], status):
+                dispatcher.notify(compose_event(key, status))
+        return status
+
+    def ostree_version(key, payload):
+        with ostree_version_sniffer(key, session=session) as sniffer:
+            return sniffer.get_ostree_version()
+
+    return {
+        'compose-status': compose_status,
+        'ostree-version': ostree_version,
+    }
+
+
+def schedule_composes(backend, check, kinds=('compose-status', )):
+    """
+    Enqueues work for every known compose. Composes already enqueued by
+    another node are left alone, and done tasks are enqueued again unless
+    their result is final for their kind (see FINAL_RESULTS), so running
+    this periodically polls composes until they finished.
+
+    :param backend: Where tasks are enqueued.
+    :type backend: release_dashboard.coordination.LeaseBackend
+    :param check: Status check providing the versions.
+    :type check: release_dashboard.checks.AtomicStatusCheck
+    :param kinds: Kinds of work to enqueue per compose.
+    :type kinds: iterable
+    :returns: The number of tasks added or enqueued again
+    :rtype: int
+    """
+    added = 0
+    for version in check.get_versions():
+        for kind in kinds:
+            if backend.enqueue(kind, version):
+                added += 1
+            elif kind in FINAL_RESULTS:
+                added += backend.requeue(kind, version, FINAL_RESULTS[kind])
+    return added
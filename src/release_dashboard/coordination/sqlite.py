@@ -0,0 +1,195 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+SQLite lease backend.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from release_dashboard.coordination import Lease, LeaseBackend, LeaseLost
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """
+    Lease backend on a SQLite database. Claims take SQLite's write lock,
+    which is a file lock, so any number of processes sharing the file (on
+    one node or on a filesystem with working locks) never claim the same
+    task twice.
+
+    Example::
+
+       backend = SQLiteLeaseBackend('/srv/dashboard/work.sqlite')
+       backend.enqueue('compose-status', 'Fedora-Atomic-27-20180213.0')
+    """
+
+    def __init__(self, path, max_attempts=3, clock=time.time):
+        """
+        Initializes a new instance of SQLiteLeaseBackend.
+
+        :param path: Path to the shared SQLite database.
+        :type path: str
+        :param max_attempts: Failures before a task is given up on.
+        :type max_attempts: int
+        :param clock: Wall clock shared by all nodes.
+        :type clock: callable
+        """
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._max_attempts = max_attempts
+        self._clock = clock
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'kind TEXT, key TEXT, payload TEXT, state TEXT, worker TEXT, '
+            'token TEXT, expires REAL, attempts INTEGER, result TEXT, '
+            'error TEXT, PRIMARY KEY (kind, key))')
+
+    def _write(self, func, *args):
+        """
+        Runs func inside a transaction holding the database write lock.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                value = func(*args)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return value
+
+    def enqueue(self, kind, key, payload=None):
+        def insert():
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO tasks (kind, key, payload, state, '
+                'attempts) VALUES (?, ?, ?, ?, 0)',
+                (kind, key, json.dumps(payload), 'pending'))
+            return cursor.rowcount == 1
+        return self._write(insert)
+
+    def requeue(self, kind, key, keep=()):
+        keep = [json.dumps(result) for result in keep]
+
+        def update():
+            cursor = self._conn.execute(
+                'UPDATE tasks SET state = ?, attempts = 0, error = NULL '
+                'WHERE kind = ? AND key = ? AND state = ? AND result NOT IN '
+                '({})'.format(', '.join('?' * len(keep))),
+                ['pending', kind, key, 'done'] + keep)
+            return cursor.rowcount == 1
+        return self._write(update)
+
+    def _next_task(self, now, kinds):
+        """
+        Returns the next pending task or task whose lease expired.
+        """
+        query = (
+            'SELECT kind, key, payload, attempts, state FROM tasks WHERE '
+            '(state = ? OR (state = ? AND expires < ?))')
+        params = ['pending', 'leased', now]
+        if kinds:
+            query += ' AND kind IN ({})'.format(', '.join('?' * len(kinds)))
+            params.extend(kinds)
+        return self._conn.execute(
+            query + ' ORDER BY rowid LIMIT 1', params).fetchone()
+
+    def claim(self, worker, kinds=None, ttl=60):
+        def take():
+            now = self._clock()
+            while True:
+                row = self._next_task(now, kinds)
+                if row is None:
+                    return None
+                kind, key, payload, attempts, state = row
+                if state == 'leased':
+                    # The worker holding the lease crashed or hung, which
+                    # counts as a failed attempt
+                    attempts += 1
+                if attempts < self._max_attempts:
+                    break
+                self._conn.execute(
+                    'UPDATE tasks SET state = ?, attempts = ?, error = ? '
+                    'WHERE kind = ? AND key = ?',
+                    ('failed', attempts, 'Lease expired', kind, key))
+            lease = Lease(
+                kind, key, json.loads(payload), uuid.uuid4().hex, worker,
+                now + ttl, attempts)
+            self._conn.execute(
+                'UPDATE tasks SET state = ?, worker = ?, token = ?, '
+                'expires = ?, attempts = ? WHERE kind = ? AND key = ?',
+                ('leased', worker, lease.token, lease.expires, attempts,
+                 kind, key))
+            return lease
+        return self._write(take)
+
+    def _update(self, lease, assignments, values):
+        """
+        Updates the task of a lease as long as the lease is still held.
+        """
+        cursor = self._conn.execute(
+            'UPDATE tasks SET {} WHERE kind = ? AND key = ? AND token = ? '
+            'AND state = ? AND expires >= ?'.format(assignments),
+            list(values) + [lease.kind, lease.key, lease.token, 'leased',
+                            self._clock()])
+        if cursor.rowcount != 1:
+            raise LeaseLost('Lease on {} {} was lost'.format(
+                lease.kind, lease.key))
+
+    def renew(self, lease, ttl=60):
+        expires = self._clock() + ttl
+        self._write(self._update, lease, 'expires = ?', [expires])
+        return lease._replace(expires=expires)
+
+    def complete(self, lease, result=None):
+        self._write(
+            self._update, lease, 'state = ?, result = ?, error = NULL',
+            ['done', json.dumps(result)])
+
+    def fail(self, lease, error):
+        attempts = lease.attempts + 1
+        state = 'failed' if attempts >= self._max_attempts else 'pending'
+        self._write(
+            self._update, lease, 'state = ?, attempts = ?, error = ?',
+            [state, attempts, error])
+
+    def result(self, kind, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state, result FROM tasks WHERE kind = ? AND key = ?',
+                (kind, key)).fetchone()
+        if row is None:
+            return None
+        return row[0], (json.loads(row[1]) if row[1] else None)
+
+    def counts(self):
+        """
+        Counts tasks by state.
+
+        :returns: Mapping of state to number of tasks
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._conn.execute(
+                'SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._conn.close()
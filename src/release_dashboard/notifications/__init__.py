@@ -0,0 +1,344 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Notification related integrations.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class NotificationError(Exception):
+    """
+    Base error for notifications.
+    """
+    pass
+
+
+class Event:
+    """
+    Something worth telling people about, such as a compose state change.
+    Events with the same key replace each other while waiting to be sent.
+    """
+
+    __slots__ = ('subject', 'key', 'body', 'data', 'created')
+
+    def __init__(self, subject, key=None, body='', data=None):
+        """
+        Initializes a new instance of Event.
+
+        :param subject: One line summary.
+        :type subject: str
+        :param key: Optional coalescing key, for example a compose version.
+        :type key: str
+        :param body: Optional longer description.
+        :type body: str
+        :param data: Optional JSON serializable details.
+        :type data: dict
+        """
+        self.subject = subject
+        self.key = key
+        self.body = body
+        self.data = data or {}
+        self.created = time.time()
+
+    def as_dict(self):
+        """
+        Returns the event as a plain dictionary.
+
+        :rtype: dict
+        """
+        return {
+            'subject': self.subject,
+            'key': self.key,
+            'body': self.body,
+            'data': self.data,
+            'created': self.created,
+        }
+
+
+def compose_event(version, status):
+    """
+    Creates the event for a compose changing state.
+
+    :param version: Version of the compose.
+    :type version: release_dashboard.checks.version.ComposeVersion
+    :param status: The new status of the compose.
+    :type status: str
+    :rtype: release_dashboard.notifications.Event
+    """
+    version = str(version)
+    return Event(
+        '{} is {}'.format(version, status), key=version,
+        data={'version': version, 'status': status})
+
+
+def render_digest(events):
+    """
+    Renders events as a plain text digest.
+
+    :param events: The events to render.
+    :type events: list
+    :returns: The digest
+    :rtype: str
+    """
+    lines = ['{} update{}:'.format(len(events), '' if len(events) == 1
+                                   else 's')]
+    for event in events:
+        lines.append('- {}'.format(event.subject))
+        if event.body:
+            lines.extend('  ' + line for line in event.body.splitlines())
+    return '\n'.join(lines) + '\n'
+
+
+class Channel(metaclass=ABCMeta):  # pragma: no cover
+    """
+    Somewhere notifications are delivered to.
+    """
+
+    #: Seconds events are collected before sending. None uses the
+    #: dispatcher's window.
+    window = None
+
+    @abstractmethod
+    def send(self, events):
+        """
+        Delivers a batch of events in a single send.
+
+        :param events: The coalesced events, oldest first.
+        :type events: list
+        :raises: release_dashboard.notifications.NotificationError
+        """
+        pass
+
+
+_STOP = object()
+_FLUSH = object()
+
+
+class Dispatcher:
+    """
+    Fans events out to channels. Events wait in a bounded queue and are
+    collected per channel for a window, replacing earlier events with the
+    same key, then delivered as one batch. Deliveries run concurrently and
+    are retried with exponential backoff.
+
+    Example::
+
+       with Dispatcher([ChatChannel(hook_url), EmailChannel(...)]) as d:
+           d.notify(compose_event('Fedora-Atomic-27-20180213.0', 'finished'))
+    """
+
+    def __init__(self, channels, window=30.0, max_queue=1000, max_batch=100,
+                 retries=3, backoff=1.0, workers=4, sleep=time.sleep,
+                 logger=None):
+        """
+        Initializes a new instance of Dispatcher.
+
+        :param channels: Where events are delivered to.
+        :type channels: list
+        :param window: Default seconds to collect events before sending.
+        :type window: float
+        :param max_queue: Maximum events waiting to be collected.
+        :type max_queue: int
+        :param max_batch: Send early once a channel collected this many.
+        :type max_batch: int
+        :param retries: Times a failed send is retried.
+        :type retries: int
+        :param backoff: Seconds before the first retry, doubled each time.
+        :type backoff: float
+        :param workers: Maximum sends running at the same time.
+        :type workers: int
+        :param sleep: Sleep function used between retries.
+        :type sleep: callable
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._channels = list(channels)
+        self._window = window
+        self._max_batch = max_batch
+        self._retries = retries
+        self._backoff = backoff
+        self._sleep = sleep
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {channel: OrderedDict() for channel in self._channels}
+        self._deadlines = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._deliveries = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ids = itertools.count()
+        self.stats = {'queued': 0, 'dropped': 0, 'sent': 0, 'failed': 0}
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('Dispatcher')
+
+    def start(self):
+        """
+        Starts collecting events in a background thread.
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify(self, event, block=False):
+        """
+        Queues an event.
+
+        :param event: The event to deliver.
+        :type event: release_dashboard.notifications.Event
+        :param block: Wait for room instead of dropping when the queue is
+            full.
+        :type block: bool
+        :returns: True if queued, False if dropped
+        :rtype: bool
+        """
+        try:
+            self._queue.put(event, block=block)
+        except queue.Full:
+            self._count('dropped')
+            self._logger.warning('Queue full, dropping %s', event.subject)
+            return False
+        self._count('queued')
+        return True
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def flush(self):
+        """
+        Sends everything collected so far and waits for the deliveries.
+
+        :raises: release_dashboard.notifications.NotificationError
+        """
+        if self._thread is None:
+            raise NotificationError('Dispatcher is not running')
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+        with self._lock:
+            deliveries = list(self._deliveries)
+        wait(deliveries)
+
+    def stop(self):
+        """
+        Sends everything collected so far and stops.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        """
+        Used for context management.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """
+        Stop on context management exit.
+        """
+        self.stop()
+
+    def _timeout(self):
+        """
+        Returns seconds until the next channel is due or None.
+        """
+        if not self._deadlines:
+            return None
+        return max(0, min(self._deadlines.values()) - time.monotonic())
+
+    def _collect(self, event):
+        """
+        Adds an event to every channel, replacing one with the same key.
+        """
+        key = event.key if event.key is not None else next(self._ids)
+        for channel, pending in self._pending.items():
+            pending.pop(key, None)
+            pending[key] = event
+            if channel not in self._deadlines:
+                window = channel.window
+                if window is None:
+                    window = self._window
+                self._deadlines[channel] = time.monotonic() + window
+
+    def _send_due(self, force=False):
+        """
+        Submits the batches of channels which are due.
+        """
+        now = time.monotonic()
+        for channel, pending in self._pending.items():
+            if not pending:
+                continue
+            if force or len(pending) >= self._max_batch or (
+                    self._deadlines[channel] <= now):
+                events = list(pending.values())
+                pending.clear()
+                del self._deadlines[channel]
+                future = self._executor.submit(self._deliver, channel, events)
+                with self._lock:
+                    self._deliveries.add(future)
+                future.add_done_callback(self._delivered)
+
+    def _delivered(self, future):
+        with self._lock:
+            self._deliveries.discard(future)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._timeout())
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._send_due(force=True)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                self._send_due(force=True)
+                item[1].set()
+            elif item is not None:
+                self._collect(item)
+            self._send_due()
+
+    def _deliver(self, channel, events):
+        """
+        Sends a batch to a channel, retrying with exponential backoff.
+        """
+        delay = self._backoff
+        for attempt in range(self._retries + 1):
+            try:
+                channel.send(events)
+                self._count('sent')
+                return True
+            except Exception as err:
+                self._logger.warning(
+                    'Sending %d events to %s failed (attempt %d): %s',
+                    len(events), type(channel).__name__, attempt + 1, err)
+                if attempt < self._retries:
+                    self._sleep(delay)
+                    delay *= 2
+        self._count('failed')
+        return False
@@ -0,0 +1,87 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Email notification channel.
+"""
+
+import smtplib
+
+from email.message import EmailMessage
+
+from release_dashboard.notifications import (
+    Channel, NotificationError, render_digest)
+
+
+class EmailChannel(Channel):
+    """
+    Mails a digest of events over SMTP.
+
+    Example::
+
+       channel = EmailChannel(
+           'smtp.example.com', 'dashboard@example.com',
+           ['atomic@lists.example.com'], window=300)
+    """
+
+    def __init__(self, host, sender, recipients, port=25, window=None,
+                 subject='Release dashboard: {count} update(s)',
+                 smtp=smtplib.SMTP):
+        """
+        Creates an instance of the email channel.
+
+        :param host: SMTP server to send through.
+        :type host: str
+        :param sender: The From address.
+        :type sender: str
+        :param recipients: The To addresses.
+        :type recipients: list
+        :param port: SMTP server port.
+        :type port: int
+        :param window: Optional seconds to collect events before sending.
+        :type window: float
+        :param subject: Subject template, given the event count as count.
+        :type subject: str
+        :param smtp: SMTP client class.
+        :type smtp: type
+        """
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.window = window
+        self._subject = subject
+        self._smtp = smtp
+
+    def message(self, events):
+        """
+        Builds the digest mail for a batch.
+
+        :param events: The events to mail.
+        :type events: list
+        :rtype: email.message.EmailMessage
+        """
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(self.recipients)
+        msg['Subject'] = self._subject.format(count=len(events))
+        msg.set_content(render_digest(events))
+        return msg
+
+    def send(self, events):
+        try:
+            with self._smtp(self.host, self.port) as smtp:
+                smtp.send_message(self.message(events))
+        except (OSError, smtplib.SMTPException) as err:
+            raise NotificationError(err.__class__.__name__, *err.args)
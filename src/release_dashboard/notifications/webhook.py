@@ -0,0 +1,84 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Webhook and chat notification channels.
+"""
+
+import requests
+
+from release_dashboard.notifications import (
+    Channel, NotificationError, render_digest)
+
+
+class WebhookChannel(Channel):
+    """
+    Posts batches of events as JSON to a webhook.
+
+    Example::
+
+       channel = WebhookChannel('https://hooks.example.com/dashboard')
+    """
+
+    def __init__(self, url, window=None, timeout=30, session=None):
+        """
+        Creates an instance of the webhook channel.
+
+        :param url: Where to post events to.
+        :type url: str
+        :param window: Optional seconds to collect events before sending.
+        :type window: float
+        :param timeout: Seconds to wait for the webhook.
+        :type timeout: float
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
+        """
+        self.url = url
+        self.window = window
+        self._timeout = timeout
+        self._http = session if session is not None else requests
+
+    def payload(self, events):
+        """
+        Builds the JSON document posted for a batch.
+
+        :param events: The events to post.
+        :type events: list
+        :rtype: dict
+        """
+        return {'events': [event.as_dict() for event in events]}
+
+    def send(self, events):
+        try:
+            resp = self._http.post(
+                self.url, json=self.payload(events), timeout=self._timeout)
+        except requests.exceptions.RequestException as err:
+            raise NotificationError(*err.args)
+        if resp.status_code >= 300:
+            raise NotificationError(
+                'Webhook returned {}'.format(resp.status_code))
+
+
+class ChatChannel(WebhookChannel):
+    """
+    Posts a text digest to a Slack or Mattermost compatible incoming
+    webhook.
+
+    Example::
+
+       channel = ChatChannel('https://chat.example.com/hooks/abc', window=30)
+    """
+
+    def payload(self, events):
+        return {'text': render_digest(events)}
@@ -0,0 +1,398 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Pipelines of dependent, memoized steps.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from release_dashboard.checks import ostree_version_sniffer
+from release_dashboard.checks.version import ComposeVersion
+
+
+class PipelineError(Exception):
+    """
+    Base error for pipelines.
+    """
+    pass
+
+
+class Step:
+    """
+    A single named unit of work in a pipeline.
+
+    The callable is invoked with one keyword argument per name in requires.
+    A required name is either another step, in which case its output is
+    passed, or a parameter given to Pipeline.run.
+    """
+
+    def __init__(self, name, func, requires=(), memoize=True):
+        """
+        Initializes a new instance of Step.
+
+        :param name: Unique name of the step.
+        :type name: str
+        :param func: Callable doing the work.
+        :type func: callable
+        :param requires: Names of steps or parameters the step needs.
+        :type requires: iterable
+        :param memoize: If the output should be stored for later runs.
+        :type memoize: bool
+        """
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.memoize = memoize
+
+    def key(self, inputs):
+        """
+        Computes the memoization key of the step for the given inputs.
+
+        :param inputs: The keyword arguments the step will be called with.
+        :type inputs: dict
+        :returns: A hex digest identifying the step and its inputs
+        :rtype: str
+        :raises: release_dashboard.pipeline.PipelineError
+        """
+        try:
+            data = json.dumps(
+                [self.name, inputs], sort_keys=True, default=_key_default)
+        except TypeError as err:
+            raise PipelineError(
+                'Inputs of {} can not be memoized: {}'.format(self.name, err))
+        return hashlib.sha256(data.encode('utf8')).hexdigest()
+
+
+def _key_default(obj):
+    """
+    Serializes compose versions in memoization keys as their string, so
+    they share memoized outputs with the same version given as a string.
+    """
+    if isinstance(obj, ComposeVersion):
+        return str(obj)
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(obj).__name__))
+
+
+class MemoStore:
+    """
+    Stores step outputs by key. Kept in memory unless a directory is given,
+    in which case every output is written as its own JSON file so a later
+    process can pick it up.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initializes a new instance of MemoStore.
+
+        :param path: Optional directory to persist outputs in.
+        :type path: str
+        """
+        self._path = path
+        self._data = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self._path, key + '.json')
+
+    def get(self, key):
+        """
+        Looks up a stored output.
+
+        :param key: The key of the output.
+        :type key: str
+        :returns: Tuple of (found, output)
+        :rtype: tuple
+        """
+        with self._lock:
+            if key in self._data:
+                return True, self._data[key]
+        if self._path is None:
+            return False, None
+        try:
+            with open(self._file(key), 'r') as fobj:
+                value = json.load(fobj)
+        except (OSError, ValueError):
+            return False, None
+        with self._lock:
+            self._data[key] = value
+        return True, value
+
+    def set(self, key, value):
+        """
+        Stores an output.
+
+        :param key: The key of the output.
+        :type key: str
+        :param value: The JSON serializable output.
+        :type value: object
+        """
+        with self._lock:
+            self._data[key] = value
+        if self._path is not None:
+            # Write then rename so an interrupted run never leaves half a file
+            tmp = self._file(key) + '.tmp'
+            with open(tmp, 'w') as fobj:
+                json.dump(value, fobj)
+            os.replace(tmp, self._file(key))
+
+
+class Pipeline:
+    """
+    Runs steps as a dependency graph. Steps whose requirements are met run
+    in parallel and memoized outputs are reused instead of rerunning a step.
+
+    Example::
+
+       p = Pipeline(store=MemoStore('/var/cache/release-dashboard'))
+       p.add(Step('a', lambda version: version.upper(), ['version']))
+       p.add(Step('b', lambda a: a + '!', ['a']))
+       print(p.run(version='x')['b'])
+    """
+
+    def __init__(self, steps=(), store=None, max_workers=4, logger=None):
+        """
+        Initializes a new instance of Pipeline.
+
+        :param steps: Optional steps to start with.
+        :type steps: iterable
+        :param store: Where outputs are memoized. Default: in memory.
+        :type store: release_dashboard.pipeline.MemoStore
+        :param max_workers: Maximum steps running at the same time.
+        :type max_workers: int
+        :param logger: An optional logger to use internally.
+        :type logger: logging.Logger
+        """
+        self._steps = {}
+        self._store = store if store is not None else MemoStore()
+        self._max_workers = max_workers
+        if logger is not None:
+            self._logger = logger
+        else:
+            self._logger = logging.getLogger('Pipeline')
+        for step in steps:
+            self.add(step)
+
+    @property
+    def steps(self):
+        """
+        Property that lists the names of all steps.
+        """
+        return list(self._steps)
+
+    def add(self, step):
+        """
+        Adds a step to the pipeline.
+
+        :param step: The step to add.
+        :type step: release_dashboard.pipeline.Step
+        :raises: release_dashboard.pipeline.PipelineError
+        """
+        if step.name in self._steps:
+            raise PipelineError('Duplicate step: {}'.format(step.name))
+        self._steps[step.name] = step
+
+    def order(self, params=()):
+        """
+        Validates the graph and returns the steps in dependency order.
+
+        :param params: Names of the parameters the run will be given.
+        :type params: iterable
+        :returns: Step names, dependencies first
+        :rtype: list
+        :raises: release_dashboard.pipeline.PipelineError
+        """
+        params = set(params)
+        ordered = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise PipelineError('Cycle: {}'.format(
+                    ' -> '.join(path + [name])))
+            state[name] = 'visiting'
+            for req in self._steps[name].requires:
+                if req in self._steps:
+                    visit(req, path + [name])
+                elif req not in params:
+                    raise PipelineError(
+                        '{} requires unknown {}'.format(name, req))
+            state[name] = 'done'
+            ordered.append(name)
+
+        for name in self._steps:
+            visit(name, [])
+        return ordered
+
+    def _run_step(self, step, inputs):
+        """
+        Runs a single step, reusing its memoized output when available.
+        """
+        key = step.key(inputs) if step.memoize else None
+        if key is not None:
+            found, value = self._store.get(key)
+            if found:
+                self._logger.info('Reusing memoized output of %s', step.name)
+                return value
+        self._logger.info('Running %s', step.name)
+        value = step.func(**inputs)
+        if key is not None:
+            self._store.set(key, value)
+        return value
+
+    def run(self, **params):
+        """
+        Runs every step of the pipeline.
+
+        :param params: Parameters steps may require.
+        :type params: dict
+        :returns: Mapping of step name to output
+        :rtype: dict
+        :raises: release_dashboard.pipeline.PipelineError
+        """
+        pending = self.order(params)
+        results = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while pending or running:
+                for name in self._ready(pending, results):
+                    pending.remove(name)
+                    step = self._steps[name]
+                    inputs = {
+                        req: results[req] if req in self._steps
+                        else params[req] for req in step.requires}
+                    running[executor.submit(
+                        self._run_step, step, inputs)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as err:
+                        for other in running:
+                            other.cancel()
+                        raise PipelineError(
+                            'Step {} failed: {}: {}'.format(
+                                name, type(err).__name__, err)) from err
+        return results
+
+    def _ready(self, pending, results):
+        """
+        Lists pending steps whose step requirements all have results.
+        """
+        return [
+            name for name in pending
+            if all(req in results for req in self._steps[name].requires
+                   if req in self._steps)]
+
+
+def _sniff_ostree_version(version, sniffer=None, session=None):
+    """
+    Downloads a compose's image and reads its ostree version.
+    """
+    if sniffer is None:
+        sniffer = ostree_version_sniffer
+    with sniffer(version, session=session) as s:
+        return s.get_ostree_version()
+
+
+def _ticket_context(version, ostree_pungi_id, ostree_version):
+    """
+    Assembles the JSON serializable context of the release request.
+    """
+    return {
+        'compose': str(ComposeVersion.parse(version)),
+        'ostree_pungi_id': ostree_pungi_id,
+        'ostree_version': ostree_version,
+    }
+
+
+def release_pipeline(tracker, check=None, store=None, sniffer=None,
+                     session=None):
+    """
+    Builds the pipeline which files the two week release request.
+
+    The pipeline is run with a version parameter (for example
+    Fedora-Atomic-27-20180213.0). The ostree pungi id is derived from the
+    latest updates compose of the release dated before the atomic compose
+    (for example Fedora-27-updates-20180212.0).
+
+    :param tracker: The tracker to file the release request in.
+    :type tracker: release_dashboard.trackers.Tracker
+    :param check: Optional status check to use.
+    :type check: release_dashboard.checks.AtomicStatusCheck
+    :param store: Where outputs are memoized. Default: in memory.
+    :type store: release_dashboard.pipeline.MemoStore
+    :param sniffer: Optional OstreeVersionSniffer compatible class.
+    :type sniffer: type
+    :param session: Optional session to send requests with.
+    :type session: requests.Session
+    :returns: The release pipeline
+    :rtype: release_dashboard.pipeline.Pipeline
+    """
+    if check is None:
+        from release_dashboard.checks import AtomicStatusCheck
+        check = AtomicStatusCheck(session=session)
+
+    def has_version(version):
+        if not check.has_version(version):
+            raise PipelineError('Unknown version {}'.format(version))
+        return True
+
+    def compose_status(version):
+        if not check.verify_compose_status(version):
+            raise PipelineError('Compose {} is not finished'.format(version))
+        return True
+
+    def ostree_pungi_id(version):
+        updates = check.latest_updates_compose(version)
+        if updates is None:
+            raise PipelineError(
+                'No updates compose found before {}'.format(version))
+        return updates.pungi_id
+
+    def ostree_version(version, has_version, compose_status):
+        return _sniff_ostree_version(version, sniffer, session)
+
+    def ticket(ticket_context):
+        # Memoized outputs are JSON, so the version is parsed again here
+        context = dict(
+            ticket_context,
+            compose=ComposeVersion.parse(ticket_context['compose']))
+        return tracker.create_templatized_issue(
+            'Two week release of Fedora Atomic Host {}'.format(
+                context['ostree_version']),
+            'create_release_request.txt', context)
+
+    return Pipeline([
+        Step('has_version', has_version, ['version']),
+        Step('compose_status', compose_status, ['version']),
+        Step('ostree_pungi_id', ostree_pungi_id, ['version']),
+        Step('ostree_version', ostree_version,
+             ['version', 'has_version', 'compose_status']),
+        Step('ticket_context', _ticket_context,
+             ['version', 'ostree_pungi_id', 'ostree_version']),
+        Step('ticket', ticket, ['ticket_context']),
+    ], store=store)
@@ -33,7 +33,8 @@ class PagureTracker(Tracker):
        issue_id = pg.create_issue('subject', 'the body\nof the ticket')
     """
 
-    def __init__(self, project, auth_token=os.getenv('PAGURE_TOKEN')):
+    def __init__(self, project, auth_token=os.getenv('PAGURE_TOKEN'),
+                 session=None):
         """
         Creates an instance of the Pagure tracker integration.
 
@@ -41,11 +42,16 @@ class PagureTracker(Tracker):
         :type repo: str
         :param auth_token: Authentication token. Default: env:PAGURE_TOKEN.
         :type auth_token: str
+        :param session: Optional session to send requests with.
+        :type session: requests.Session
         :raises: release_dashboard.trackers.TrackerError
         """
         if auth_token is None:
             raise TrackerError('No valid token found')
         self.pg = Pagure(pagure_token=auth_token, pagure_repository=project)
+        if session is not None:
+            session.headers.update(self.pg.session.headers)
+            self.pg.session = session
 
     def create_issue(self, title, body):
         """
@@ -0,0 +1,431 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+HTTP transports recording and replaying exchanges.
+
+Every class talking HTTP takes an optional session. Passing a session from
+recording_session or replay_session records or replays all of its traffic.
+
+An archive is a gzip compressed JSON lines file with one line per exchange.
+Bodies are streamed into compressed files in a directory next to it, see
+body_directory, so recording and replaying large downloads never holds them
+in memory.
+"""
+
+import gzip
+import json
+import os
+import statistics
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+#: Headers describing the encoding on the wire rather than the stored body.
+_UNREPLAYABLE_HEADERS = ('content-encoding', 'transfer-encoding')
+
+
+class TransportError(requests.exceptions.ConnectionError):
+    """
+    Base error for transports.
+    """
+    pass
+
+
+def body_directory(path):
+    """
+    Returns the directory holding the bodies of an archive.
+
+    :param path: Path to the archive.
+    :type path: str
+    :rtype: str
+    """
+    return path + '.bodies'
+
+
+class _TeeReader:
+    """
+    Wraps the raw stream of a response and writes everything read from it,
+    chunk by chunk, to a compressed body file.
+    """
+
+    def __init__(self, raw, path, finished):
+        self._raw = raw
+        self._path = path
+        self._finished = finished
+        self._fobj = None
+        self._done = False
+        self.size = 0
+        # urllib3 responses decode Content-Encoding only when asked to
+        self._decode = hasattr(raw, 'stream')
+
+    def read(self, amt=None, *args, **kwargs):
+        if self._decode:
+            data = self._raw.read(amt, decode_content=True)
+        else:
+            data = self._raw.read(amt)
+        if data and not self._done:
+            if self._fobj is None:
+                self._fobj = gzip.open(self._path, 'wb', compresslevel=6)
+            self._fobj.write(data)
+            self.size += len(data)
+        if not data or amt is None:
+            self.finish()
+        return data
+
+    def stream(self, amt=65536, decode_content=None):
+        while True:
+            data = self.read(amt)
+            if not data:
+                return
+            yield data
+
+    def finish(self):
+        """
+        Closes the body file. Bodies are recorded as far as they were read.
+        """
+        if not self._done:
+            self._done = True
+            if self._fobj is not None:
+                self._fobj.close()
+            self._finished(self)
+
+    def close(self):
+        self.finish()
+        self._raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _BodyReader:
+    """
+    Reads an archived body file lazily and closes it once read. Given the
+    seconds the body took to arrive, reads are paced to take as long.
+    """
+
+    def __init__(self, path, size=0, seconds=0, sleep=time.sleep,
+                 clock=time.monotonic):
+        self._path = path
+        self._fobj = None
+        self._done = False
+        self._rate = size / seconds if size and seconds else None
+        self._sleep = sleep
+        self._clock = clock
+        self._started = clock()
+        self._read = 0
+
+    def _pace(self, data):
+        """
+        Waits until the recorded transfer delivered everything read so far.
+        """
+        self._read += len(data)
+        delay = self._started + self._read / self._rate - self._clock()
+        if delay > 0:
+            self._sleep(delay)
+
+    def read(self, amt=None, *args, **kwargs):
+        if self._done:
+            return b''
+        if self._fobj is None:
+            if not os.path.exists(self._path):
+                # Empty bodies are not written
+                self._done = True
+                return b''
+            self._fobj = gzip.open(self._path, 'rb')
+        data = self._fobj.read(-1 if amt is None else amt)
+        if data and self._rate:
+            self._pace(data)
+        if not data or amt is None:
+            self.close()
+        return data
+
+    def close(self):
+        self._done = True
+        if self._fobj is not None:
+            self._fobj.close()
+            self._fobj = None
+
+
+def load_archive(path):
+    """
+    Loads the metadata of every exchange from an archive. Bodies stay on
+    disk until they are read.
+
+    :param path: Path to the gzip compressed JSON lines archive.
+    :type path: str
+    :returns: The exchanges in recording order
+    :rtype: list
+    """
+    with gzip.open(path, 'rt', encoding='utf8') as fobj:
+        return [json.loads(line) for line in fobj if line.strip()]
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends requests through a real adapter and appends each exchange to an
+    archive as one gzip compressed JSON line. Bodies are written to their
+    own files while the caller reads them, and the exchange is appended
+    once its body was read, with the seconds until the headers arrived
+    (elapsed) and until the body arrived (transfer).
+    """
+
+    def __init__(self, path, adapter=None):
+        """
+        Initializes a new instance of RecordingAdapter.
+
+        :param path: Path of the archive to write.
+        :type path: str
+        :param adapter: Adapter doing the real work. Default: HTTPAdapter.
+        :type adapter: requests.adapters.BaseAdapter
+        """
+        super().__init__()
+        self._adapter = adapter if adapter is not None else HTTPAdapter()
+        self._bodies = body_directory(path)
+        os.makedirs(self._bodies, exist_ok=True)
+        self._fobj = gzip.open(path, 'wt', encoding='utf8')
+        self._lock = threading.Lock()
+        self._count = 0
+        self._reading = {}
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        resp = self._adapter.send(request, **kwargs)
+        with self._lock:
+            self._count += 1
+            body = '{:06d}.gz'.format(self._count)
+            exchange = {
+                'method': request.method,
+                'url': request.url,
+                'status': resp.status_code,
+                'reason': resp.reason,
+                'headers': {
+                    k: v for k, v in resp.headers.items()
+                    if k.lower() not in _UNREPLAYABLE_HEADERS},
+                'elapsed': round(time.monotonic() - started, 6),
+                'body': body,
+            }
+            resp.raw = _TeeReader(
+                resp.raw, os.path.join(self._bodies, body), self._finished)
+            self._reading[resp.raw] = (exchange, time.monotonic())
+        return resp
+
+    def _finished(self, reader):
+        with self._lock:
+            exchange, received = self._reading.pop(reader)
+            exchange['transfer'] = round(time.monotonic() - received, 6)
+            exchange['size'] = reader.size
+            self._fobj.write(json.dumps(exchange) + '\n')
+
+    def close(self):
+        with self._lock:
+            reading = list(self._reading)
+        # Bodies still being read are kept as far as they got
+        for reader in reading:
+            reader.finish()
+        with self._lock:
+            if not self._fobj.closed:
+                self._fobj.close()
+        self._adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from an archive. Repeated requests for the same url
+    get the recorded responses in order, then the last one again.
+    """
+
+    def __init__(self, path, speed=None, sleep=time.sleep,
+                 clock=time.monotonic):
+        """
+        Initializes a new instance of ReplayAdapter.
+
+        :param path: Path of the archive to replay.
+        :type path: str
+        :param speed: None replays at full speed, 1.0 with the recorded
+            timings of headers and bodies, 2.0 twice as fast and so on.
+        :type speed: float
+        :param sleep: Sleep function to use.
+        :type sleep: callable
+        :param clock: Monotonic clock to pace bodies with.
+        :type clock: callable
+        """
+        super().__init__()
+        self._bodies = body_directory(path)
+        self._speed = speed
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._exchanges = {}
+        for exchange in load_archive(path):
+            key = (exchange['method'], exchange['url'])
+            self._exchanges.setdefault(key, deque()).append(exchange)
+
+    def _next(self, request):
+        with self._lock:
+            queue = self._exchanges.get((request.method, request.url))
+            if not queue:
+                raise TransportError(
+                    'No recorded exchange for {} {}'.format(
+                        request.method, request.url), request=request)
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def send(self, request, **kwargs):
+        exchange = self._next(request)
+        seconds = 0
+        if self._speed:
+            self._sleep(exchange['elapsed'] / self._speed)
+            seconds = exchange['transfer'] / self._speed
+        resp = requests.Response()
+        resp.status_code = exchange['status']
+        resp.reason = exchange.get('reason')
+        resp.headers = CaseInsensitiveDict(exchange['headers'])
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.raw = _BodyReader(
+            os.path.join(self._bodies, exchange['body']), exchange['size'],
+            seconds, self._sleep, self._clock)
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        return resp
+
+    def close(self):
+        pass
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def recording_session(path):
+    """
+    Creates a session which records all exchanges to path. Close the
+    session to finish writing the archive.
+
+    :param path: Path of the archive to write.
+    :type path: str
+    :rtype: requests.Session
+    """
+    return _session(RecordingAdapter(path))
+
+
+def replay_session(path, speed=None):
+    """
+    Creates a session which answers requests from the archive at path.
+
+    :param path: Path of the archive to replay.
+    :type path: str
+    :param speed: See ReplayAdapter.
+    :type speed: float
+    :rtype: requests.Session
+    """
+    return _session(ReplayAdapter(path, speed=speed))
+
+
+class LoadReplayer:
+    """
+    Replays the requests of an archive against a live deployment with many
+    concurrent clients and reports how it held up.
+
+    Example::
+
+       stats = LoadReplayer(
+           'kojipkgs.jsonl.gz', concurrency=32,
+           rewrite=('https://kojipkgs.fedoraproject.org',
+                    'http://staging.example.com')).run()
+    """
+
+    def __init__(self, path, concurrency=8, repeat=1, rewrite=None,
+                 session=None):
+        """
+        Initializes a new instance of LoadReplayer.
+
+        :param path: Path of the archive to replay.
+        :type path: str
+        :param concurrency: Number of concurrent clients.
+        :type concurrency: int
+        :param repeat: How many times to send the whole archive.
+        :type repeat: int
+        :param rewrite: Optional (old, new) url prefix replacement.
+        :type rewrite: tuple
+        :param session: Optional session. Default: a live session pooling
+            one connection per client.
+        :type session: requests.Session
+        """
+        self._exchanges = load_archive(path)
+        self._concurrency = concurrency
+        self._repeat = repeat
+        self._rewrite = rewrite
+        if session is None:
+            # The default pool keeps 10 connections, so more clients would
+            # keep reconnecting and skew the results
+            session = _session(HTTPAdapter(
+                pool_connections=concurrency, pool_maxsize=concurrency))
+        self._session = session
+
+    def _url(self, url):
+        if self._rewrite and url.startswith(self._rewrite[0]):
+            return self._rewrite[1] + url[len(self._rewrite[0]):]
+        return url
+
+    def _send(self, exchange):
+        started = time.monotonic()
+        try:
+            resp = self._session.request(
+                exchange['method'], self._url(exchange['url']), stream=True)
+            with resp:
+                for _ in resp.iter_content(chunk_size=65536):
+                    pass
+            ok = resp.status_code == exchange['status']
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.monotonic() - started, ok
+
+    def run(self):
+        """
+        Sends every archived request repeat times.
+
+        :returns: Request count, errors, seconds, requests per second and
+            latency percentiles
+        :rtype: dict
+        """
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            results = list(executor.map(
+                self._send, self._exchanges * self._repeat))
+        seconds = time.monotonic() - started
+        latencies = sorted(latency for latency, _ in results) or [0.0]
+        return {
+            'requests': len(results),
+            'errors': sum(1 for _, ok in results if not ok),
+            'concurrency': self._concurrency,
+            'seconds': seconds,
+            'rps': len(results) / seconds if seconds else 0.0,
+            'latency_median': statistics.median(latencies),
+            'latency_p95': latencies[
+                min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'latency_max': latencies[-1],
+        }
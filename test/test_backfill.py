@@ -0,0 +1,323 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Backfill tests.
+"""
+
+import threading
+import time
+
+import pytest
+
+from unittest import mock
+
+from release_dashboard import backfill
+from release_dashboard.checks.version import ComposeVersion
+
+
+VERSIONS = ['Fedora-Atomic-27-201802{:02}.0'.format(x) for x in range(1, 21)]
+
+ARCHIVE = 'https://kojipkgs.example.com/compose/archive/'
+
+
+class FakeIndex:
+    """
+    Stand in for ArchiveIndex.
+    """
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.limiter = None
+
+    def walk(self):
+        for version in VERSIONS:
+            if version == self.fail_on:
+                raise KeyboardInterrupt()
+            yield backfill.ArchivedCompose(
+                ComposeVersion.parse(version), ARCHIVE + version + '/')
+
+
+class FakeStatus:
+    """
+    Stand in for requests.get answering STATUS while tracking concurrency.
+    """
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.checked = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        assert url.startswith(ARCHIVE) and url.endswith('/STATUS')
+        version = url[len(ARCHIVE):-len('/STATUS')]
+        with self.lock:
+            self.checked.append(version)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        status = self.statuses.get(version, 'FINISHED')
+        if status is None:
+            return mock.MagicMock(status_code=404)
+        return mock.MagicMock(status_code=200, text=status + '\n')
+
+
+def fake_head(url, allow_redirects=True):
+    assert url.startswith(ARCHIVE)
+    assert url.endswith('.x86_64.qcow2')
+    return mock.MagicMock(
+        status_code=200, headers={'Content-Length': '612368384'})
+
+
+def listing(*names):
+    """
+    Renders an Apache style directory listing.
+    """
+    entries = ['<a href="?C=N;O=D">Name</a>',
+               '<a href="/compose/">Parent Directory</a>']
+    entries.extend('<a href="{0}">{0}</a>'.format(name) for name in names)
+    return '<html><body>{}</body></html>'.format('\n'.join(entries))
+
+
+class FakeArchive:
+    """
+    Session serving directory listings in small streamed chunks.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, stream=False):
+        assert stream is True
+        self.requested.append(url)
+        if url not in self.pages:
+            return mock.MagicMock(status_code=404)
+        data = self.pages[url].encode('utf8')
+        chunks = [data[i:i + 16] for i in range(0, len(data), 16)]
+        return mock.MagicMock(
+            status_code=200, encoding='utf-8',
+            iter_content=lambda chunk_size: iter(chunks))
+
+
+class TestRateLimiter:
+
+    def test_acquire(self):
+        """
+        Verify calls are spaced out to the given rate.
+        """
+        now = [100.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        limiter = backfill.RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            limiter.acquire()
+        assert slept == [0.25, 0.25]
+
+        # Disabled when no rate is given
+        limiter = backfill.RateLimiter(None, sleep=sleep)
+        limiter.acquire()
+        assert len(slept) == 2
+
+
+class TestBackfillStore:
+
+    def test_checkpoints(self, tmpdir):
+        """
+        Ensure records only survive a crash once checkpointed.
+        """
+        path = str(tmpdir.join('history.sqlite'))
+        store = backfill.BackfillStore(path, checkpoint_every=2)
+        store.save({'version': 'a', 'status': 'finished'})
+        assert backfill.BackfillStore(path).done('a') is False
+        store.save({'version': 'b', 'status': 'doomed'})
+        assert backfill.BackfillStore(path).done('a') is True
+        store.save({'version': 'c', 'error': 'boom'})
+        store.save({'version': 'd', 'status': 'started'})
+        store.close()
+
+        store = backfill.BackfillStore(path)
+        # Errors and composes which were still running are retried
+        assert store.done('c') is False
+        assert store.done('d') is False
+        assert [r['version'] for r in store.records()] == [
+            'a', 'b', 'c', 'd']
+        assert list(store.records())[1]['status'] == 'doomed'
+
+
+class TestArchiveIndex:
+
+    def test_walk(self):
+        """
+        Verify composes are found in the archive and its subdirectories.
+        """
+        session = FakeArchive({
+            ARCHIVE: listing(
+                VERSIONS[0] + '/', '27/', 'latest-Fedora-Atomic-27/',
+                'Fedora-27-updates-20180212.0/', 'README'),
+            ARCHIVE + '27/': listing(VERSIONS[1] + '/', 'deeper/'),
+            ARCHIVE + '27/deeper/': listing(VERSIONS[2] + '/'),
+        })
+        index = backfill.ArchiveIndex(ARCHIVE, session=session)
+        assert list(index.walk()) == [
+            (VERSIONS[0], ARCHIVE + VERSIONS[0] + '/'),
+            (VERSIONS[1], ARCHIVE + '27/' + VERSIONS[1] + '/'),
+        ]
+        # Other composes are skipped, latest- links are not descended into
+        # and depth is limited
+        assert session.requested == [ARCHIVE, ARCHIVE + '27/']
+
+        session.requested = []
+        index = backfill.ArchiveIndex(ARCHIVE, max_depth=2, session=session)
+        assert len(list(index.walk())) == 3
+
+    def test_streamed(self):
+        """
+        Ensure composes are yielded before the listing is fully read.
+        """
+        chunks_read = []
+        data = listing(*[v + '/' for v in VERSIONS]).encode('utf8')
+
+        def iter_content(chunk_size):
+            for i in range(0, len(data), 64):
+                chunks_read.append(i)
+                yield data[i:i + 64]
+
+        session = mock.MagicMock()
+        session.get.return_value = mock.MagicMock(
+            status_code=200, encoding=None, iter_content=iter_content)
+        walk = backfill.ArchiveIndex(ARCHIVE, session=session).walk()
+        assert next(walk).version == VERSIONS[0]
+        assert len(chunks_read) < len(data) / 64
+        assert len(list(walk)) == len(VERSIONS) - 1
+        session.get.return_value.close.assert_called_once_with()
+
+    def test_rate_limited(self):
+        """
+        Ensure every listing waits for the limiter shared with the backfill.
+        """
+        session = FakeArchive({
+            ARCHIVE: listing(VERSIONS[0] + '/', '27/'),
+            ARCHIVE + '27/': listing(VERSIONS[1] + '/'),
+        })
+        index = backfill.ArchiveIndex(ARCHIVE, session=session)
+        bf = backfill.Backfill(mock.MagicMock(), index=index)
+        assert index.limiter is bf._limiter
+        index.limiter = mock.MagicMock()
+        assert len(list(index.walk())) == 2
+        assert index.limiter.acquire.call_count == 2
+
+    def test_missing_listing(self):
+        """
+        Verify listings which can not be read are skipped.
+        """
+        session = FakeArchive({ARCHIVE: listing('gone/')})
+        index = backfill.ArchiveIndex(ARCHIVE, session=session)
+        assert list(index.walk()) == []
+        assert session.requested == [ARCHIVE, ARCHIVE + 'gone/']
+
+
+class TestBackfill:
+
+    def test_run(self, tmpdir):
+        """
+        Verify every compose is recorded with bounded concurrency.
+        """
+        store = backfill.BackfillStore(str(tmpdir.join('h.sqlite')))
+        status = FakeStatus({VERSIONS[0]: 'DOOMED', VERSIONS[1]: None})
+        with mock.patch('requests.head', side_effect=fake_head), \
+                mock.patch('requests.get', side_effect=status):
+            bf = backfill.Backfill(
+                store, index=FakeIndex(), workers=3, rate=None)
+            assert bf.run() == len(VERSIONS)
+        assert status.max_active <= 3
+        records = {r['version']: r for r in store.records()}
+        assert len(records) == len(VERSIONS)
+        assert records[VERSIONS[0]]['status'] == 'doomed'
+        assert records[VERSIONS[1]]['error'] == 'STATUS could not be read'
+        assert records[VERSIONS[2]]['image_size'] == 612368384
+        assert records[VERSIONS[2]]['ostree_version'] is None
+
+    def test_resume(self, tmpdir):
+        """
+        Ensure an interrupted run keeps its progress and a rerun resumes.
+        """
+        path = str(tmpdir.join('h.sqlite'))
+        store = backfill.BackfillStore(path, checkpoint_every=1000)
+        status = FakeStatus()
+        with mock.patch('requests.head', side_effect=fake_head), \
+                mock.patch('requests.get', side_effect=status):
+            with pytest.raises(KeyboardInterrupt):
+                backfill.Backfill(
+                    store, index=FakeIndex(fail_on=VERSIONS[10]),
+                    rate=None).run()
+            # Checkpointed despite the large batch size
+            first = len(list(backfill.BackfillStore(path).records()))
+            assert 0 < first <= 10
+
+            status.checked = []
+            backfill.Backfill(store, index=FakeIndex(), rate=None).run()
+        assert len(status.checked) == len(VERSIONS) - first
+        assert len(list(store.records())) == len(VERSIONS)
+
+    def test_recheck_running(self, tmpdir):
+        """
+        Verify composes which were still running are checked again.
+        """
+        store = backfill.BackfillStore(str(tmpdir.join('h.sqlite')))
+        with mock.patch('requests.head', side_effect=fake_head):
+            with mock.patch('requests.get', side_effect=FakeStatus(
+                    {VERSIONS[3]: 'STARTED'})):
+                backfill.Backfill(store, index=FakeIndex(), rate=None).run()
+            status = FakeStatus()
+            with mock.patch('requests.get', side_effect=status):
+                backfill.Backfill(store, index=FakeIndex(), rate=None).run()
+        assert status.checked == [VERSIONS[3]]
+        records = {r['version']: r for r in store.records()}
+        assert records[VERSIONS[3]]['status'] == 'finished'
+
+    def test_fetch_errors(self, tmpdir):
+        """
+        Verify failures are recorded instead of stopping the backfill.
+        """
+        store = backfill.BackfillStore(str(tmpdir.join('h.sqlite')))
+        compose = next(FakeIndex().walk())
+        with mock.patch('requests.head', side_effect=IOError('reset')), \
+                mock.patch('requests.get', side_effect=FakeStatus()):
+            record = backfill.Backfill(store, index=FakeIndex()).fetch(
+                compose)
+        assert record['status'] == 'finished'
+        assert record['error'] == 'OSError: reset'
+
+    def test_fetch_ostree(self, tmpdir):
+        """
+        Ensure finished composes are sniffed when asked to.
+        """
+        store = backfill.BackfillStore(str(tmpdir.join('h.sqlite')))
+        bf = backfill.Backfill(store, index=FakeIndex(), sniff_ostree=True)
+        with mock.patch('requests.head', side_effect=fake_head), \
+                mock.patch('requests.get', side_effect=FakeStatus()), \
+                mock.patch.object(bf, '_ostree_version') as _ov:
+            _ov.return_value = '27.16'
+            record = bf.fetch(next(FakeIndex().walk()))
+        assert record['ostree_version'] == '27.16'
+        assert _ov.call_args[0][0].url == ARCHIVE + VERSIONS[0] + '/'
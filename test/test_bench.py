@@ -0,0 +1,56 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark harness tests.
+"""
+
+import requests
+
+from bench.kojipkgs import SimulatedKojipkgs, generate_versions
+from release_dashboard.checks import AtomicStatusCheck, download
+
+
+class TestSimulatedKojipkgs:
+
+    def test_index(self):
+        """
+        Verify the simulated index parses into the generated versions.
+        """
+        with SimulatedKojipkgs(composes=20) as koji:
+            check = AtomicStatusCheck(
+                compose_endpoint_tpl=koji.compose_endpoint_tpl,
+                version_endpoint=koji.version_endpoint)
+            assert list(check.get_versions()) == generate_versions(20)
+            assert check.verify_compose_status(koji.versions[0]) is True
+
+    def test_failure_rate(self):
+        """
+        Ensure about the configured share of STATUS requests fail.
+        """
+        koji = SimulatedKojipkgs(composes=1, failure_rate=0.3)
+        failures = sum(koji.should_fail() for _ in range(10000))
+        assert 2500 < failures < 3500
+        with SimulatedKojipkgs(composes=1, failure_rate=1.0) as koji:
+            url = koji.compose_endpoint_tpl.format(koji.versions[0])
+            assert requests.get(url).status_code == 500
+
+    def test_image(self, tmpdir):
+        """
+        Verify images stream at the configured size.
+        """
+        path = str(tmpdir.join('image.qcow2'))
+        with SimulatedKojipkgs(composes=1, image_size=100000) as koji:
+            assert download(koji.image_url(koji.versions[0]), path) == 100000
+        assert tmpdir.join('image.qcow2').size() == 100000
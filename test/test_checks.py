@@ -27,7 +27,19 @@ def mock_get_versions():
     Mock version of AtomicStatusCheck.get_versions().
     """
     for x in range(1, 3):
-        yield x
+        yield checks.ComposeVersion.parse(
+            'Fedora-Atomic-27-20180213.{}'.format(x))
+
+
+def index_response(content, status_code=200, chunk_size=7):
+    """
+    Mock response streaming content in small chunks.
+    """
+    data = content.encode('utf8')
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    return mock.MagicMock(
+        status_code=status_code, encoding=None,
+        iter_content=lambda chunk_size: iter(chunks))
 
 
 class TestAtomicStatusCheck:
@@ -59,7 +71,9 @@ class TestAtomicStatusCheck:
         """
         asc = checks.AtomicStatusCheck()
         asc.get_versions = mock_get_versions
-        assert asc.versions == [1, 2]
+        assert isinstance(asc.versions, checks.VersionList)
+        assert asc.versions == [
+            'Fedora-Atomic-27-20180213.1', 'Fedora-Atomic-27-20180213.2']
 
     def test_has_version(self):
         """
@@ -67,8 +81,11 @@ class TestAtomicStatusCheck:
         """
         asc = checks.AtomicStatusCheck()
         asc.get_versions = mock_get_versions
-        assert asc.has_version(1) is True
-        assert asc.has_version(999) is False
+        assert asc.has_version('Fedora-Atomic-27-20180213.1') is True
+        assert asc.has_version(
+            checks.ComposeVersion.parse('Fedora-Atomic-27-20180213.2')) is True
+        assert asc.has_version('Fedora-Atomic-27-20180213.3') is False
+        assert asc.has_version('garbage') is False
 
     def test_verify_compose_status(self):
         """
@@ -103,24 +120,59 @@ class TestAtomicStatusCheck:
 
         with mock.patch('requests.get') as _get:
             # Verify we have two versions
-            _get.return_value = mock.MagicMock(
-                text=content, status_code=200)
+            _get.return_value = index_response(content)
             versions = checks.AtomicStatusCheck().get_versions()
             version_list = [x for x in versions]
             assert len(version_list) == 2
             assert 'Fedora-Atomic-27-20180213.0' in version_list
             assert 'Fedora-Atomic-27-20180213.1' in version_list
+            assert version_list[0].pungi_id == '20180213.0'
+            _get.assert_called_with(
+                'https://kojipkgs.fedoraproject.org/compose/twoweek/'
+                '?C=M;O=D', stream=True)
+            _get.return_value.close.assert_called_once_with()
 
             # No data, we should have no versions
-            _get.return_value = mock.MagicMock(
-                text='', status_code=200)
+            _get.return_value = index_response('')
             versions = checks.AtomicStatusCheck().get_versions()
             version_list = [x for x in versions]
             assert len(version_list) == 0
 
             # Bad response, we should have no versions
-            _get.return_value = mock.MagicMock(
-                text=content, status_code=500)
+            _get.return_value = index_response(content, 500)
             versions = checks.AtomicStatusCheck().get_versions()
             version_list = [x for x in versions]
             assert len(version_list) == 0
+
+    def test_latest_updates_compose(self):
+        """
+        Verify the updates compose before an atomic compose is found.
+        """
+        names = [
+            'Fedora-27-updates-20180213.0', 'Fedora-27-updates-20180212.1',
+            'Fedora-27-updates-20180212.0', 'Fedora-27-updates-testing-'
+            '20180212.2', 'Fedora-28-updates-20180212.3', 'README']
+        content = ''.join(
+            '<a href="{0}/">{0}/</a>'.format(name) for name in names)
+        with mock.patch('requests.get') as _get:
+            _get.return_value = index_response(content)
+            asc = checks.AtomicStatusCheck()
+            assert list(asc.get_updates_composes('27')) == names[:3]
+            assert asc.latest_updates_compose(
+                'Fedora-Atomic-27-20180213.0') == names[1]
+            assert asc.latest_updates_compose(
+                'Fedora-Atomic-27-20180101.0') is None
+
+    def test_get_compose_status(self):
+        """
+        Ensure the raw compose status is returned when it can be read.
+        """
+        with mock.patch('requests.get') as _get:
+            _get.return_value = mock.MagicMock(
+                text='DOOMED\n', status_code=200)
+            asc = checks.AtomicStatusCheck()
+            assert asc.get_compose_status('version') == 'doomed'
+
+            _get.return_value = mock.MagicMock(
+                text='FINISHED\n', status_code=404)
+            assert asc.get_compose_status('version') is None
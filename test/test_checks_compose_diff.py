@@ -0,0 +1,222 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests for compose_diff.
+"""
+
+import json
+
+import pytest
+
+from unittest import mock
+
+from bench.run import RenderTracker
+from release_dashboard.checks import compose_diff
+
+
+COMPOSES = {
+    'Fedora-Atomic-27-20180201.0': [
+        'bash-0:4.4.12-12.fc27.x86_64',
+        'kernel-0:4.14.16-300.fc27.x86_64',
+        'vim-minimal-2:8.0.1438-1.fc27.x86_64',
+    ],
+    'Fedora-Atomic-27-20180202.0': [
+        'bash-0:4.4.12-14.fc27.x86_64',
+        'kernel-0:4.14.16-300.fc27.x86_64',
+        'vim-minimal-2:8.0.1438-1.fc27.x86_64',
+        'podman-0:0.2-1.fc27.x86_64',
+    ],
+    'Fedora-Atomic-27-20180203.0': [
+        'bash-0:4.4.12-14.fc27.x86_64',
+        'kernel-0:4.14.18-300.fc27.x86_64',
+        'podman-0:0.2-1.fc27.x86_64',
+    ],
+}
+
+
+def rpms_json(nevras):
+    """
+    Builds a productmd style rpms.json document.
+    """
+    rpms = {}
+    for nevra in nevras:
+        srpm = nevra.rsplit('.', 1)[0] + '.src'
+        rpms.setdefault(srpm, {})[nevra] = {
+            'category': 'binary', 'path': 'Packages/x/{}.rpm'.format(nevra),
+            'sigkey': '"f5282ee4\\u00e9"'}
+    return json.dumps({
+        'header': {'type': 'productmd.rpms', 'version': '1.2'},
+        'payload': {
+            'compose': {'id': 'x', 'list': ['a', 1, None, True, 2.5]},
+            'rpms': {'AtomicHost': {'x86_64': rpms}},
+        },
+    }, indent=1).encode('utf8')
+
+
+def chunked(data, size):
+    return [data[x:x + size] for x in range(0, len(data), size)]
+
+
+def fake_get(requested):
+    """
+    Returns a requests.get stand in serving COMPOSES.
+    """
+    def get(url, stream=False):
+        version = url.split('/')[-4]
+        requested.append(version)
+        if version not in COMPOSES:
+            return mock.MagicMock(status_code=404)
+        resp = mock.MagicMock(status_code=200)
+        resp.iter_content.return_value = chunked(
+            rpms_json(COMPOSES[version]), 7)
+        return resp
+    return get
+
+
+class TestStreamParsing:
+
+    def test_iter_rpms(self):
+        """
+        Verify NEVRAs are found no matter how the document is chunked.
+        """
+        data = rpms_json(COMPOSES['Fedora-Atomic-27-20180202.0'])
+        expected = sorted(COMPOSES['Fedora-Atomic-27-20180202.0'])
+        for size in (1, 3, 64, len(data)):
+            found = list(compose_diff.iter_rpms(chunked(data, size)))
+            assert sorted(nevra for _, _, nevra in found) == expected
+            assert {(v, a) for v, a, _ in found} == {('AtomicHost', 'x86_64')}
+
+    def test_iter_rpms_escapes_and_multibyte(self):
+        """
+        Ensure escaped keys and split multibyte characters are handled.
+        """
+        data = json.dumps({'payload': {'rpms': {'Vé': {'x86_64': {
+            's': {'a\\"b-0:1-1.x86_64': {}}}}}}}, ensure_ascii=False)
+        found = list(compose_diff.iter_rpms(chunked(data.encode('utf8'), 1)))
+        assert found == [('Vé', 'x86_64', 'a\\"b-0:1-1.x86_64')]
+
+    def test_iter_rpms_invalid(self):
+        """
+        Verify broken documents raise a ComposeDiffError.
+        """
+        with pytest.raises(compose_diff.ComposeDiffError):
+            list(compose_diff.iter_rpms([b'{"payload": "unterminated']))
+
+
+class TestSplitNevra:
+
+    def test_split_nevra(self):
+        """
+        Verify NEVRAs split into interned parts with a default epoch.
+        """
+        assert compose_diff.split_nevra('vim-minimal-2:8.0-1.fc27.x86_64') == (
+            'vim-minimal', 'x86_64', ('2', '8.0', '1.fc27'))
+        assert compose_diff.split_nevra('bash-4.4-1.noarch')[2][0] == '0'
+
+
+class TestComposeDiffer:
+
+    def differ(self):
+        check = mock.MagicMock()
+        check.versions = list(COMPOSES) + ['Fedora-Atomic-27-20180202.1']
+        return compose_diff.ComposeDiffer(check=check)
+
+    def test_diff(self):
+        """
+        Verify added, removed, upgraded and downgraded packages.
+        """
+        requested = []
+        with mock.patch('requests.get', side_effect=fake_get(requested)):
+            differ = self.differ()
+            diff = differ.diff(
+                'Fedora-Atomic-27-20180202.0', 'Fedora-Atomic-27-20180203.0')
+            assert diff.added == []
+            assert diff.removed == [
+                (('vim-minimal', 'x86_64'), ('2', '8.0.1438', '1.fc27'))]
+            assert diff.upgraded == [(
+                ('kernel', 'x86_64'),
+                ('0', '4.14.16', '300.fc27'), ('0', '4.14.18', '300.fc27'))]
+            back = differ.diff(
+                'Fedora-Atomic-27-20180203.0', 'Fedora-Atomic-27-20180202.0')
+            assert [k for k, _, _ in back.downgraded] == [
+                ('kernel', 'x86_64')]
+            assert [k for k, _ in back.added] == [('vim-minimal', 'x86_64')]
+            # Both package sets were only fetched once
+            assert len(requested) == 2
+
+            with pytest.raises(compose_diff.ComposeDiffError):
+                differ.diff('Fedora-Atomic-27-20180202.0', 'missing')
+
+    def test_responses_closed(self):
+        """
+        Ensure responses are closed when missing or broken.
+        """
+        missing = mock.MagicMock(status_code=404)
+        broken = mock.MagicMock(status_code=200)
+        broken.iter_content.return_value = [b'{"payload": "unterminated']
+        with mock.patch('requests.get', side_effect=[missing, broken]):
+            differ = self.differ()
+            assert differ.packages('Fedora-Atomic-27-20180201.0') is None
+            with pytest.raises(compose_diff.ComposeDiffError):
+                differ.packages('Fedora-Atomic-27-20180202.0')
+        missing.close.assert_called_once_with()
+        broken.close.assert_called_once_with()
+
+    def test_range(self):
+        """
+        Ensure ranges are built from cached consecutive diffs.
+        """
+        requested = []
+        with mock.patch('requests.get', side_effect=fake_get(requested)):
+            differ = self.differ()
+            diffs = differ.diff_range(
+                'Fedora-Atomic-27-20180201.0', 'Fedora-Atomic-27-20180203.0')
+            # The compose without metadata is skipped
+            assert [(d.old, d.new) for d in diffs] == [
+                ('Fedora-Atomic-27-20180201.0', 'Fedora-Atomic-27-20180202.0'),
+                ('Fedora-Atomic-27-20180202.0', 'Fedora-Atomic-27-20180203.0'),
+            ]
+            assert len(requested) == 4
+
+            net = differ.range_diff(
+                'Fedora-Atomic-27-20180201.0', 'Fedora-Atomic-27-20180203.0')
+            assert len(requested) == 4
+            assert net.old == 'Fedora-Atomic-27-20180201.0'
+            assert net.new == 'Fedora-Atomic-27-20180203.0'
+            assert [k for k, _ in net.added] == [('podman', 'x86_64')]
+            assert [k for k, _ in net.removed] == [('vim-minimal', 'x86_64')]
+            assert [k for k, _, _ in net.upgraded] == [
+                ('bash', 'x86_64'), ('kernel', 'x86_64')]
+            assert compose_diff.PackageDiff.combine([]).changes == {}
+
+    def test_as_context(self):
+        """
+        Verify diffs can be rendered with the compose_diff.txt template.
+        """
+        with mock.patch('requests.get', side_effect=fake_get([])):
+            diff = self.differ().range_diff(
+                'Fedora-Atomic-27-20180201.0', 'Fedora-Atomic-27-20180203.0')
+        context = diff.as_context()
+        assert context['upgraded'][0] == {
+            'name': 'bash', 'arch': 'x86_64',
+            'old': '0:4.4.12-12.fc27', 'new': '0:4.4.12-14.fc27'}
+        content = RenderTracker().create_templatized_issue(
+            'title', 'compose_diff.txt', context)
+        assert '- podman-0:0.2-1.fc27.x86_64' in content
+        # Sections are tight lists separated by a blank line
+        assert 'Added:\n- podman' in content
+        assert '\n\n- ' not in content
+        assert 'kernel.x86_64: 0:4.14.16-300.fc27 -> 0:4.14.18-300.fc27' in (
+            content)
@@ -0,0 +1,169 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests for image_inspection.
+"""
+
+import pytest
+
+from unittest import mock
+
+
+# Skip this test if guestfs can not be used
+try:
+    import guestfs
+except:
+    import sys
+    sys.stderr.write('\n\n!!! Unable to import guestfs. '
+          'Coverage will likely not be able to meet the minimum !!!\n\n')
+    pytest.importorskip("guestfsa")
+
+from release_dashboard.checks import image_inspection
+
+DEPLOY = '/ostree/deploy/fedora-atomic/deploy/'
+CHECKSUM = 'd428d3ad8ae7a7e8fd3cb7e5a1e1e4a8'
+
+FILES = {
+    DEPLOY + CHECKSUM + '.0/usr/lib/os.release.d/os-release-fedora': (
+        'NAME=Fedora\nOSTREE_VERSION=\'27.16\'\n'),
+}
+
+DIRS = {
+    DEPLOY: [CHECKSUM + '.0', CHECKSUM + '.0.origin'],
+    DEPLOY + CHECKSUM + '.0/usr/lib/modules': [
+        '4.14.18-300.fc27.x86_64', '4.15.3-300.fc27.x86_64',
+        '4.9.81-300.fc27.x86_64'],
+}
+
+REFS = {
+    '/ostree/repo/refs/heads': ['ostree', 'ostree/0'],
+    '/ostree/repo/refs/remotes': [
+        'fedora-atomic', 'fedora-atomic/fedora',
+        'fedora-atomic/fedora/27/x86_64/atomic-host'],
+}
+
+
+def fake_guest(gfs):
+    """
+    Makes the mocked GuestFS behave like a mounted Atomic Host image.
+    """
+    guest = gfs()
+    guest.ls.side_effect = lambda path: DIRS[path]
+    guest.cat.side_effect = lambda path: FILES[path]
+    guest.is_dir.side_effect = lambda path: path in REFS
+    guest.find.side_effect = lambda path: REFS[path]
+    guest.is_file.side_effect = lambda path: path.endswith(
+        ('/0', '/atomic-host'))
+    return guest
+
+
+class BrokenProbe(image_inspection.Probe):
+    name = 'broken'
+
+    def probe(self, guest, deployment):
+        raise ValueError('nope')
+
+
+class TestImageInspector:
+
+    def test_many_probes_one_launch(self):
+        """
+        Verify all registered probes run in a single launch.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs:
+            guest = fake_guest(_gfs)
+            inspector = image_inspection.ImageInspector('image.qcow2')
+            inspector.register(
+                image_inspection.OstreeVersionProbe(),
+                image_inspection.CommitChecksumProbe(),
+                image_inspection.KernelVersionProbe(),
+                image_inspection.OstreeRefsProbe())
+            result = inspector.inspect()
+            assert guest.launch.call_count == 1
+            guest.mount.assert_called_once_with('/dev/atomicos/root', '/')
+            assert result['ostree_version'] == '27.16'
+            assert result['commit'] == CHECKSUM
+            assert result['kernel'] == '4.15.3-300.fc27.x86_64'
+            assert result['refs'] == [
+                'fedora-atomic:fedora/27/x86_64/atomic-host', 'ostree/0']
+            assert result.deployment.path == DEPLOY + CHECKSUM + '.0'
+            assert result.as_dict()['values']['commit'] == CHECKSUM
+
+            # Asking again, or for a subset, does not launch again
+            inspector.inspect()
+            inspector.inspect([image_inspection.CommitChecksumProbe()])
+            assert guest.launch.call_count == 1
+            assert inspector.launches == 1
+
+    def test_new_probe_launches_again(self):
+        """
+        Ensure only probes which have not run yet are run on a new launch.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs:
+            guest = fake_guest(_gfs)
+            inspector = image_inspection.ImageInspector('image.qcow2')
+            inspector.inspect([image_inspection.OstreeVersionProbe()])
+            assert guest.cat.call_count == 1
+            result = inspector.inspect([
+                image_inspection.OstreeVersionProbe(),
+                image_inspection.KernelVersionProbe()])
+            assert guest.launch.call_count == 2
+            assert guest.cat.call_count == 1
+            assert result['ostree_version'] == '27.16'
+
+    def test_probe_errors(self):
+        """
+        Verify a failing probe is recorded without stopping the others.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs:
+            fake_guest(_gfs)
+            inspector = image_inspection.ImageInspector('image.qcow2')
+            result = inspector.inspect([
+                BrokenProbe(), image_inspection.CommitChecksumProbe()])
+            assert result['commit'] == CHECKSUM
+            assert 'nope' in result.errors['broken']
+            with pytest.raises(image_inspection.InspectionError):
+                result['broken']
+            with pytest.raises(image_inspection.InspectionError):
+                result['kernel']
+
+    def test_launch_errors(self):
+        """
+        Ensure failing to launch the image raises an InspectionError.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs:
+            guest = _gfs()
+            guest.launch.side_effect = RuntimeError('no kvm')
+            inspector = image_inspection.ImageInspector('image.qcow2')
+            with pytest.raises(image_inspection.InspectionError):
+                inspector.inspect([image_inspection.CommitChecksumProbe()])
+            assert guest.close.called
+
+    def test_rpm_packages(self):
+        """
+        Verify the rpm database is copied out and queried.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs, \
+                mock.patch('subprocess.check_output') as _check_output:
+            guest = fake_guest(_gfs)
+            _check_output.return_value = (
+                b'zsh-0:5.4.2-1.fc27.x86_64\nbash-0:4.4.12-14.fc27.x86_64\n')
+            inspector = image_inspection.ImageInspector('image.qcow2')
+            result = inspector.inspect([image_inspection.RpmPackagesProbe()])
+            assert result['packages'] == [
+                'bash-0:4.4.12-14.fc27.x86_64', 'zsh-0:5.4.2-1.fc27.x86_64']
+            assert guest.copy_out.call_args[0][0] == (
+                DEPLOY + CHECKSUM + '.0/usr/share/rpm')
+            assert '--dbpath' in _check_output.call_args[0][0]
@@ -126,3 +126,16 @@ class TestAtomicOstreeVersionSniffer:
             ovs = ostree_version.OstreeVersionSniffer(version)
             # Ensure the right version was found and returned
             assert ovs.get_ostree_version() == '27.16'
+
+    def test_inspect_reuses_launch(self):
+        """
+        Verify repeated inspections of the same image launch it once.
+        """
+        with mock.patch('guestfs.GuestFS') as _gfs:
+            _gfs().ls.return_value = ['HAAAAASH']
+            _gfs().cat.return_value = OS_RELEASE
+            ovs = ostree_version.OstreeVersionSniffer('1.2.3')
+            assert ovs.get_ostree_version() == '27.16'
+            result = ovs.inspect([ostree_version.OstreeVersionProbe()])
+            assert result['ostree_version'] == '27.16'
+            assert _gfs().launch.call_count == 1
@@ -0,0 +1,45 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Tests for rpmvercmp.
+"""
+
+from release_dashboard.checks import rpmvercmp
+
+
+class TestVersionCompare:
+
+    def test_vercmp(self):
+        """
+        Verify versions compare like rpm compares them.
+        """
+        assert rpmvercmp.vercmp('1.0', '1.0') == 0
+        assert rpmvercmp.vercmp('1.0', '1.1') == -1
+        assert rpmvercmp.vercmp('1.10', '1.9') == 1
+        assert rpmvercmp.vercmp('1.0a', '1.0') == 1
+        assert rpmvercmp.vercmp('1.0', '1.0.1') == -1
+        assert rpmvercmp.vercmp('1.a', '1.1') == -1
+        assert rpmvercmp.vercmp('1.0~rc1', '1.0') == -1
+        assert rpmvercmp.vercmp('1.0~rc1', '1.0~rc2') == -1
+        assert rpmvercmp.vercmp('1.0^git1', '1.0') == 1
+        assert rpmvercmp.vercmp('1.0^git1', '1.0.1') == -1
+        assert rpmvercmp.vercmp('1.0', '1_0') == 0
+
+    def test_evrcmp(self):
+        """
+        Ensure epochs win over versions.
+        """
+        assert rpmvercmp.evrcmp(('1', '1.0', '1'), ('0', '2.0', '1')) == 1
+        assert rpmvercmp.evrcmp(('0', '1.0', '2'), ('0', '1.0', '1')) == 1
@@ -0,0 +1,167 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Compose version tests.
+"""
+
+import random
+import sqlite3
+
+import pytest
+
+from bench.run import RenderTracker
+from release_dashboard.checks.version import (
+    ComposeVersion, VersionError, VersionList)
+
+
+class TestComposeVersion:
+
+    def test_parse(self):
+        """
+        Verify versions split into interned parts and round trip.
+        """
+        version = ComposeVersion.parse('Fedora-Atomic-27-20180213.0')
+        assert version.name == 'Fedora-Atomic'
+        assert version.release == '27'
+        assert version.date == 20180213
+        assert version.respin == 0
+        assert version.pungi_id == '20180213.0'
+        assert str(version) == 'Fedora-Atomic-27-20180213.0'
+        assert ComposeVersion.parse(version) is version
+        other = ComposeVersion.parse('Fedora-Atomic-27-20180214.1')
+        assert other.name is version.name
+        assert other.release is version.release
+
+    def test_invalid(self):
+        """
+        Ensure strings which would not round trip are rejected.
+        """
+        for text in ('latest-Fedora-Atomic-27', 'Fedora-Atomic-27-2018.0',
+                     'Fedora-Atomic-27-20180213.01',
+                     'Fedora-Atomic-27-20180213.0/', 27):
+            with pytest.raises(VersionError):
+                ComposeVersion.parse(text)
+
+    def test_string_compatible(self):
+        """
+        Verify versions compare, hash and store like their strings.
+        """
+        text = 'Fedora-Atomic-27-20180213.0'
+        version = ComposeVersion.parse(text)
+        assert version == text
+        assert version != 'Fedora-Atomic-27-20180213.1'
+        assert hash(version) == hash(text)
+        assert text in {version}
+        assert '{}/STATUS'.format(version) == text + '/STATUS'
+        conn = sqlite3.connect(':memory:')
+        assert conn.execute('SELECT ?', (version, )).fetchone() == (text, )
+
+    def test_ordering(self):
+        """
+        Ensure versions sort by release, date and respin, not as strings.
+        """
+        texts = [
+            'Fedora-Atomic-Rawhide-20180101.0',
+            'Fedora-Atomic-9-20180301.0',
+            'Fedora-Atomic-27-20180213.10',
+            'Fedora-Atomic-27-20180213.2',
+            'Fedora-Atomic-27-20180101.0',
+        ]
+        assert [str(v) for v in sorted(map(ComposeVersion.parse, texts))] == [
+            'Fedora-Atomic-9-20180301.0',
+            'Fedora-Atomic-27-20180101.0',
+            'Fedora-Atomic-27-20180213.2',
+            'Fedora-Atomic-27-20180213.10',
+            'Fedora-Atomic-Rawhide-20180101.0',
+        ]
+        version = ComposeVersion.parse('Fedora-Atomic-27-20180213.2')
+        assert version < 'Fedora-Atomic-27-20180213.10'
+        assert 'Fedora-Atomic-27-20180101.0' <= version
+        with pytest.raises(TypeError):
+            version < 'garbage'
+
+    def test_template(self):
+        """
+        Verify the release request template reads the parsed version.
+        """
+        content = RenderTracker().create_templatized_issue(
+            'title', 'create_release_request.txt', {
+                'compose': ComposeVersion.parse('Fedora-Atomic-27-20180213.0'),
+                'ostree_pungi_id': '20180212.0'})
+        assert (
+            '-k fedora-27 -r 27 '
+            '--pungi-compose-id Fedora-Atomic-27-20180213.0 '
+            '--ostree-pungi-compose-id Fedora-27-updates-20180212.0'
+        ) in content
+
+
+class TestVersionList:
+
+    def test_list(self):
+        """
+        Verify the list behaves like a list of versions.
+        """
+        versions = VersionList(['Fedora-Atomic-27-20180213.0'])
+        versions.append(ComposeVersion.parse('Fedora-Atomic-28-20180501.1'))
+        assert len(versions) == 2
+        assert versions[-1] == 'Fedora-Atomic-28-20180501.1'
+        assert versions[:1] == ['Fedora-Atomic-27-20180213.0']
+        assert list(versions) == [
+            'Fedora-Atomic-27-20180213.0', 'Fedora-Atomic-28-20180501.1']
+        with pytest.raises(IndexError):
+            versions[2]
+        with pytest.raises(VersionError):
+            versions.append('garbage')
+
+    def test_contains(self):
+        """
+        Ensure lookups work with strings and stay current after appends.
+        """
+        versions = VersionList(['Fedora-Atomic-27-20180213.0'])
+        assert 'Fedora-Atomic-27-20180213.0' in versions
+        assert 'Fedora-Atomic-27-20180213.1' not in versions
+        assert 'Fedora-Atomic-28-20180213.0' not in versions
+        assert 'garbage' not in versions
+        assert 'Fedora-Atomic-27-20990101.0' not in versions
+        versions.append('Fedora-Atomic-27-20180213.1')
+        assert 'Fedora-Atomic-27-20180213.1' in versions
+        assert 'Fedora-Atomic-27-20180213.0' in versions
+
+    def test_nbytes(self):
+        """
+        Verify nbytes counts the columns and, once built, the lookup keys.
+        """
+        versions = VersionList(
+            ['Fedora-Atomic-27-20180213.0', 'Fedora-Atomic-27-20180214.0'])
+        assert versions.nbytes == 16
+        assert 'Fedora-Atomic-27-20180213.0' in versions
+        assert versions.nbytes == 32
+
+    def test_sort(self):
+        """
+        Verify sorting matches sorting the parsed versions.
+        """
+        texts = ['Fedora-Atomic-{}-201802{:02d}.{}'.format(
+            release, day, respin)
+            for release in ('26', '27', 'Rawhide')
+            for day in range(1, 29) for respin in range(3)]
+        random.Random(0).shuffle(texts)
+        versions = VersionList(texts)
+        versions.sort()
+        expected = sorted(map(ComposeVersion.parse, texts))
+        assert versions == expected
+        versions.sort(reverse=True)
+        assert versions == expected[::-1]
+        assert texts[0] in versions
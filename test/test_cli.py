@@ -0,0 +1,111 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+CLI tests.
+"""
+
+import pytest
+
+from unittest import mock
+
+from release_dashboard import cli, transport
+
+
+class TestCLI:
+
+    def test_requires_command(self):
+        """
+        Ensure a sub command is required.
+        """
+        with pytest.raises(SystemExit):
+            cli.build_parser().parse_args([])
+
+    def test_backfill(self, tmpdir):
+        """
+        Verify backfill passes its options through and closes the store.
+        """
+        db = str(tmpdir.join('h.sqlite'))
+        args = cli.build_parser().parse_args([
+            'backfill', db, '--workers', '2', '--rate', '5', '--ostree',
+            '--index', 'https://koji/archive/', '--depth', '2',
+            '--status-path', 'STATE', '--image-path', '{0}.raw'])
+        args.session = None
+        with mock.patch('release_dashboard.cli.Backfill') as _bf:
+            assert args.func(args) == 0
+            kwargs = _bf.call_args[1]
+            assert kwargs['workers'] == 2
+            assert kwargs['rate'] == 5.0
+            assert kwargs['sniff_ostree'] is True
+            assert kwargs['status_path'] == 'STATE'
+            assert kwargs['image_path_tpl'] == '{0}.raw'
+            assert kwargs['index'].url == 'https://koji/archive/'
+            assert kwargs['index']._max_depth == 2
+
+            _bf().run.side_effect = KeyboardInterrupt()
+            assert args.func(args) == 130
+
+    def test_make_session(self, tmpdir):
+        """
+        Ensure --record and --replay create the matching sessions.
+        """
+        parser = cli.build_parser()
+        archive = str(tmpdir.join('a.jsonl.gz'))
+        args = parser.parse_args(['load', 'x'])
+        assert cli.make_session(args) is None
+
+        args = parser.parse_args(['--record', archive, 'load', 'x'])
+        session = cli.make_session(args)
+        assert isinstance(
+            session.get_adapter('https://x'), transport.RecordingAdapter)
+        session.close()
+
+        args = parser.parse_args(['--replay', archive, 'load', 'x'])
+        session = cli.make_session(args)
+        assert isinstance(
+            session.get_adapter('https://x'), transport.ReplayAdapter)
+
+    def test_load(self):
+        """
+        Verify load reports failures through its exit code.
+        """
+        args = cli.build_parser().parse_args([
+            'load', 'a.jsonl.gz', '--base-url', 'http://127.0.0.1:8080'])
+        with mock.patch('release_dashboard.transport.LoadReplayer') as _lr:
+            _lr().run.return_value = {'errors': 0}
+            assert args.func(args) == 0
+            assert _lr.call_args[1]['rewrite'] == (
+                'https://kojipkgs.fedoraproject.org', 'http://127.0.0.1:8080')
+            _lr().run.return_value = {'errors': 2}
+            assert args.func(args) == 1
+
+    def test_worker(self, tmpdir):
+        """
+        Verify worker schedules and only handles the requested kinds.
+        """
+        db = str(tmpdir.join('work.sqlite'))
+        args = cli.build_parser().parse_args([
+            'worker', db, '--schedule', '--exit-when-idle',
+            '--webhook', 'https://hooks/a'])
+        args.session = None
+        with mock.patch('release_dashboard.cli.AtomicStatusCheck') as _asc, \
+                mock.patch('release_dashboard.cli.Worker') as _worker, \
+                mock.patch('release_dashboard.cli.Dispatcher') as _disp:
+            _asc().get_versions.return_value = iter(['Fedora-Atomic-27-1.0'])
+            assert args.func(args) == 0
+            assert list(_worker.call_args[0][1]) == ['compose-status']
+            _worker().run.assert_called_with(exit_when_idle=True)
+            channels = _disp.call_args[0][0]
+            assert [channel.url for channel in channels] == ['https://hooks/a']
+            _disp().stop.assert_called_once_with()
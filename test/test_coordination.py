@@ -0,0 +1,260 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Coordination tests.
+"""
+
+import sqlite3
+import threading
+import time
+
+from unittest import mock
+
+import pytest
+
+from release_dashboard import coordination
+from release_dashboard.coordination.sqlite import SQLiteLeaseBackend
+
+
+VERSIONS = ['Fedora-Atomic-27-201802{:02}.0'.format(x) for x in range(1, 31)]
+
+
+class TestWorker:
+
+    def test_workers_share_work(self, tmpdir):
+        """
+        Verify every task is handled exactly once across many workers.
+        """
+        path = str(tmpdir.join('work.sqlite'))
+        backend = SQLiteLeaseBackend(path)
+        for version in VERSIONS:
+            backend.enqueue('compose-status', version)
+        handled = []
+        lock = threading.Lock()
+
+        def handler(key, payload):
+            time.sleep(0.005)
+            with lock:
+                handled.append(key)
+            return 'finished'
+
+        counts = []
+
+        def run(name):
+            # Each worker has its own connection like a separate node would
+            worker = coordination.Worker(
+                SQLiteLeaseBackend(path), {'compose-status': handler},
+                worker_id=name)
+            counts.append(worker.run(exit_when_idle=True))
+
+        threads = [
+            threading.Thread(target=run, args=('node{}'.format(x), ))
+            for x in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(handled) == VERSIONS
+        assert sum(counts) == len(VERSIONS)
+        assert backend.counts() == {'done': len(VERSIONS)}
+        assert backend.result('compose-status', VERSIONS[0]) == (
+            'done', 'finished')
+
+    def test_failures_are_retried(self, tmpdir):
+        """
+        Ensure failing tasks are retried and eventually given up on.
+        """
+        backend = SQLiteLeaseBackend(
+            str(tmpdir.join('work.sqlite')), max_attempts=2)
+        backend.enqueue('compose-status', VERSIONS[0])
+        handler = mock.MagicMock(side_effect=IOError('reset'))
+        worker = coordination.Worker(backend, {'compose-status': handler})
+        assert worker.run(exit_when_idle=True) == 2
+        assert backend.result('compose-status', VERSIONS[0]) == (
+            'failed', None)
+
+    def test_lost_lease_is_not_completed(self, tmpdir):
+        """
+        Verify a worker whose lease expired does not overwrite the result.
+        """
+        now = [1000.0]
+        backend = SQLiteLeaseBackend(
+            str(tmpdir.join('work.sqlite')), clock=lambda: now[0])
+        backend.enqueue('compose-status', VERSIONS[0])
+
+        def stuck(key, payload):
+            # The lease runs out and another node takes over
+            now[0] += 120
+            lease = backend.claim('other')
+            backend.complete(lease, 'theirs')
+            return 'mine'
+
+        worker = coordination.Worker(backend, {'compose-status': stuck})
+        assert worker.run_once() is True
+        assert backend.result('compose-status', VERSIONS[0]) == (
+            'done', 'theirs')
+
+    def test_heartbeat_keeps_lease(self, tmpdir):
+        """
+        Ensure a long running task keeps its lease past the ttl.
+        """
+        backend = SQLiteLeaseBackend(str(tmpdir.join('work.sqlite')))
+        backend.enqueue('compose-status', VERSIONS[0])
+        stolen = []
+
+        def slow(key, payload):
+            for _ in range(4):
+                time.sleep(0.1)
+                stolen.append(backend.claim('other'))
+            return 'ok'
+
+        worker = coordination.Worker(
+            backend, {'compose-status': slow}, ttl=0.3)
+        assert worker.run_once() is True
+        assert stolen == [None] * 4
+        assert backend.result('compose-status', VERSIONS[0]) == ('done', 'ok')
+
+    def test_heartbeat_retries_renewals(self, tmpdir):
+        """
+        Verify a failed renewal is retried instead of ending the heartbeat.
+        """
+        backend = SQLiteLeaseBackend(str(tmpdir.join('work.sqlite')))
+        backend.enqueue('compose-status', VERSIONS[0])
+        renew = backend.renew
+        errors = [sqlite3.OperationalError('database is locked')]
+
+        def flaky(lease, ttl=60):
+            if errors:
+                raise errors.pop()
+            return renew(lease, ttl)
+
+        def slow(key, payload):
+            time.sleep(0.6)
+            return 'ok'
+
+        worker = coordination.Worker(
+            backend, {'compose-status': slow}, ttl=0.3)
+        with mock.patch.object(backend, 'renew', side_effect=flaky):
+            assert worker.run_once() is True
+        assert errors == []
+        assert backend.result('compose-status', VERSIONS[0]) == ('done', 'ok')
+
+    def test_heartbeat_expires(self, tmpdir):
+        """
+        Ensure a lease which could not be renewed before it expired is lost.
+        """
+        now = [1000.0]
+        backend = SQLiteLeaseBackend(
+            str(tmpdir.join('work.sqlite')), clock=lambda: now[0])
+        backend.enqueue('compose-status', VERSIONS[0])
+
+        def slow(key, payload):
+            time.sleep(0.2)
+            now[0] += 1
+            time.sleep(0.2)
+            return 'ok'
+
+        worker = coordination.Worker(
+            backend, {'compose-status': slow}, ttl=0.3, clock=lambda: now[0])
+        with mock.patch.object(
+                backend, 'renew', side_effect=IOError('unreachable')), \
+                mock.patch.object(backend, 'complete') as complete:
+            assert worker.run_once() is True
+        assert complete.called is False
+
+    def test_idle(self, tmpdir):
+        """
+        Ensure an idle worker polls until stopped.
+        """
+        backend = SQLiteLeaseBackend(str(tmpdir.join('work.sqlite')))
+        stop = threading.Event()
+        stop.set()
+        worker = coordination.Worker(backend, {})
+        assert worker.run(stop=stop) == 0
+        assert worker.run_once() is False
+        assert worker.worker_id == coordination.default_worker_id()
+
+
+class TestComposes:
+
+    def test_schedule_and_handle(self, tmpdir):
+        """
+        Verify composes are enqueued once and handled with the check.
+        """
+        backend = SQLiteLeaseBackend(str(tmpdir.join('work.sqlite')))
+        check = mock.MagicMock()
+        check.get_versions.side_effect = lambda: iter(VERSIONS[:3])
+        check.get_compose_status.return_value = 'finished'
+        kinds = ('compose-status', 'ostree-version')
+        assert coordination.schedule_composes(backend, check, kinds) == 6
+        # A second node scheduling the same composes adds nothing
+        assert coordination.schedule_composes(backend, check, kinds) == 0
+
+        # Composes which were not final yet are polled again
+        lease = backend.claim('w1', ['compose-status'])
+        backend.complete(lease, 'started')
+        lease = backend.claim('w1', ['compose-status'])
+        backend.complete(lease, 'finished')
+        lease = backend.claim('w1', ['ostree-version'])
+        backend.complete(lease, None)
+        assert coordination.schedule_composes(backend, check, kinds) == 1
+        assert backend.result('compose-status', VERSIONS[0]) == (
+            'pending', 'started')
+
+        handlers = coordination.compose_handlers(check)
+        assert sorted(handlers) == list(kinds)
+        assert handlers['compose-status'](VERSIONS[0], None) == 'finished'
+        check.get_compose_status.assert_called_once_with(VERSIONS[0])
+
+    def test_status_changes_are_notified(self, tmpdir):
+        """
+        Verify workers sharing a backend notify each status change once.
+        """
+        path = str(tmpdir.join('work.sqlite'))
+        backend = SQLiteLeaseBackend(path)
+        statuses = {VERSIONS[0]: 'started', VERSIONS[1]: 'finished'}
+        check = mock.MagicMock()
+        check.get_versions.side_effect = lambda: iter(VERSIONS[:2])
+        check.get_compose_status.side_effect = statuses.get
+        dispatcher = mock.MagicMock()
+        workers = []
+        for name in ('node1', 'node2'):
+            node = SQLiteLeaseBackend(path)
+            workers.append(coordination.Worker(
+                node, coordination.compose_handlers(
+                    check, dispatcher=dispatcher, backend=node),
+                worker_id=name))
+
+        assert coordination.schedule_composes(backend, check) == 2
+        assert workers[0].run_once() is True
+        # Composes which finished before anyone watched are not announced
+        assert workers[1].run_once() is True
+        assert coordination.schedule_composes(backend, check) == 1
+        # Another worker seeing the same status stays quiet
+        assert workers[1].run_once() is True
+        assert coordination.schedule_composes(backend, check) == 1
+        statuses[VERSIONS[0]] = 'finished'
+        assert workers[0].run_once() is True
+        assert coordination.schedule_composes(backend, check) == 0
+        assert [x[0][0].subject for x in dispatcher.notify.call_args_list] == [
+            VERSIONS[0] + ' is started', VERSIONS[0] + ' is finished']
+
+    def test_notify_needs_backend(self):
+        """
+        Ensure a dispatcher without the backend of the tasks is refused.
+        """
+        with pytest.raises(coordination.CoordinationError):
+            coordination.compose_handlers(
+                mock.MagicMock(), dispatcher=mock.MagicMock())
@@ -0,0 +1,129 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+SQLite lease backend tests.
+"""
+
+import pytest
+
+from release_dashboard.coordination import LeaseLost
+from release_dashboard.coordination.sqlite import SQLiteLeaseBackend
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSQLiteLeaseBackend:
+
+    def backend(self, tmpdir):
+        self.clock = Clock()
+        return SQLiteLeaseBackend(
+            str(tmpdir.join('work.sqlite')), clock=self.clock)
+
+    def test_enqueue_and_claim(self, tmpdir):
+        """
+        Ensure tasks are claimed once, in order and filtered by kind.
+        """
+        backend = self.backend(tmpdir)
+        assert backend.enqueue('compose-status', 'a', {'x': 1}) is True
+        assert backend.enqueue('compose-status', 'a') is False
+        assert backend.enqueue('ostree-version', 'a') is True
+
+        lease = backend.claim('w1', ['compose-status'])
+        assert (lease.kind, lease.key, lease.payload) == (
+            'compose-status', 'a', {'x': 1})
+        assert lease.expires == 1060.0
+        assert backend.claim('w2', ['compose-status']) is None
+        assert backend.claim('w2').kind == 'ostree-version'
+        assert backend.result('compose-status', 'a') == ('leased', None)
+        assert backend.result('compose-status', 'missing') is None
+
+    def test_expired_leases_are_reassigned(self, tmpdir):
+        """
+        Verify a crashed worker's task goes to another worker.
+        """
+        backend = self.backend(tmpdir)
+        backend.enqueue('compose-status', 'a')
+        lease = backend.claim('w1', ttl=10)
+        self.clock.now += 5
+        lease = backend.renew(lease, ttl=10)
+        self.clock.now += 9
+        assert backend.claim('w2') is None
+        self.clock.now += 2
+        taken = backend.claim('w2')
+        assert taken.worker == 'w2'
+        with pytest.raises(LeaseLost):
+            backend.complete(lease, 'late')
+        with pytest.raises(LeaseLost):
+            backend.renew(lease)
+        backend.complete(taken, 'ok')
+        assert backend.result('compose-status', 'a') == ('done', 'ok')
+        assert backend.counts() == {'done': 1}
+
+    def test_expired_leases_count_as_attempts(self, tmpdir):
+        """
+        Verify a task whose workers keep crashing is eventually given up on.
+        """
+        backend = self.backend(tmpdir)
+        backend.enqueue('compose-status', 'a')
+        backend.enqueue('compose-status', 'b')
+        assert backend.claim('w1', ttl=10).attempts == 0
+        self.clock.now += 11
+        assert backend.claim('w2', ttl=10).attempts == 1
+        self.clock.now += 11
+        assert backend.claim('w3', ttl=10).attempts == 2
+        self.clock.now += 11
+        # The third expiry gives up on a and hands out b instead
+        assert backend.claim('w4', ttl=10).key == 'b'
+        assert backend.result('compose-status', 'a') == ('failed', None)
+
+    def test_requeue(self, tmpdir):
+        """
+        Ensure only done tasks without a final result are enqueued again.
+        """
+        backend = self.backend(tmpdir)
+        backend.enqueue('compose-status', 'a')
+        keep = ('finished', 'failed')
+        assert backend.requeue('compose-status', 'a', keep) is False
+        backend.fail(backend.claim('w1'), 'boom')
+        backend.complete(backend.claim('w1'), 'started')
+        assert backend.requeue('compose-status', 'a', keep) is True
+        lease = backend.claim('w1')
+        assert lease.attempts == 0
+        assert backend.result('compose-status', 'a') == ('leased', 'started')
+        backend.complete(lease, 'finished')
+        assert backend.requeue('compose-status', 'a', keep) is False
+        assert backend.requeue('compose-status', 'missing', keep) is False
+        assert backend.result('compose-status', 'a') == ('done', 'finished')
+
+    def test_fail(self, tmpdir):
+        """
+        Ensure failed tasks return to pending until out of attempts.
+        """
+        backend = self.backend(tmpdir)
+        backend.enqueue('compose-status', 'a')
+        for _ in range(2):
+            backend.fail(backend.claim('w1'), 'boom')
+            assert backend.result('compose-status', 'a')[0] == 'pending'
+        backend.fail(backend.claim('w1'), 'boom')
+        assert backend.result('compose-status', 'a')[0] == 'failed'
+        assert backend.claim('w1') is None
+        backend.close()
@@ -0,0 +1,159 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Notification tests.
+"""
+
+import threading
+
+import pytest
+
+from release_dashboard import notifications
+
+
+class ListChannel(notifications.Channel):
+    """
+    Channel which keeps every batch it is sent.
+    """
+
+    def __init__(self, window=None, failures=0):
+        self.window = window
+        self.failures = failures
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def send(self, events):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise notifications.NotificationError('sink down')
+            self.batches.append([event.subject for event in events])
+
+
+class TestEvent:
+
+    def test_compose_event(self):
+        """
+        Verify compose events are keyed by version.
+        """
+        event = notifications.compose_event(
+            'Fedora-Atomic-27-20180213.0', 'finished')
+        assert event.key == 'Fedora-Atomic-27-20180213.0'
+        assert event.as_dict()['data'] == {
+            'version': 'Fedora-Atomic-27-20180213.0', 'status': 'finished'}
+
+    def test_render_digest(self):
+        """
+        Ensure digests list every subject and indent bodies.
+        """
+        digest = notifications.render_digest([
+            notifications.Event('a', body='line 1\nline 2'),
+            notifications.Event('b')])
+        assert digest == '2 updates:\n- a\n  line 1\n  line 2\n- b\n'
+
+
+class TestDispatcher:
+
+    def test_coalesce_burst(self):
+        """
+        Verify a burst of events becomes one send per channel with the
+        latest event per key.
+        """
+        chat, mail = ListChannel(), ListChannel()
+        dispatcher = notifications.Dispatcher([chat, mail], window=60)
+        with dispatcher:
+            for i in range(500):
+                dispatcher.notify(notifications.compose_event(
+                    'compose-{}'.format(i % 10), 'step-{}'.format(i)))
+            dispatcher.flush()
+            assert len(chat.batches) == 1
+            assert len(chat.batches[0]) == 10
+            assert chat.batches[0][-1] == 'compose-9 is step-499'
+            assert mail.batches == chat.batches
+        assert dispatcher.stats['queued'] == 500
+        assert dispatcher.stats['sent'] == 2
+
+    def test_window(self):
+        """
+        Ensure channels send on their own once their window passes.
+        """
+        fast, slow = ListChannel(window=0.05), ListChannel(window=60)
+        dispatcher = notifications.Dispatcher([fast, slow])
+        dispatcher.start()
+        dispatcher.notify(notifications.Event('a'))
+        dispatcher.notify(notifications.Event('b'))
+        for _ in range(100):
+            if fast.batches:
+                break
+            threading.Event().wait(0.02)
+        assert fast.batches == [['a', 'b']]
+        assert slow.batches == []
+        dispatcher.stop()
+        assert slow.batches == [['a', 'b']]
+
+    def test_max_batch(self):
+        """
+        Verify a channel sends early once it collected max_batch events.
+        """
+        sink = ListChannel()
+        with notifications.Dispatcher(
+                [sink], window=60, max_batch=3) as dispatcher:
+            for subject in 'abcde':
+                dispatcher.notify(notifications.Event(subject), block=True)
+            dispatcher.flush()
+        assert sink.batches == [['a', 'b', 'c'], ['d', 'e']]
+
+    def test_retries(self):
+        """
+        Ensure failed sends are retried with exponential backoff.
+        """
+        sleeps = []
+        flaky, dead = ListChannel(failures=2), ListChannel(failures=10)
+        with notifications.Dispatcher(
+                [flaky, dead], retries=3, backoff=0.5,
+                sleep=sleeps.append) as dispatcher:
+            dispatcher.notify(notifications.Event('a'))
+        assert flaky.batches == [['a']]
+        assert dead.batches == []
+        assert dispatcher.stats['sent'] == 1
+        assert dispatcher.stats['failed'] == 1
+        assert sorted(sleeps) == [0.5, 0.5, 1.0, 1.0, 2.0]
+
+    def test_bounded_queue(self):
+        """
+        Verify events are dropped instead of blocking when the queue is full.
+        """
+        sink = ListChannel()
+        dispatcher = notifications.Dispatcher([sink], max_queue=2)
+        assert dispatcher.notify(notifications.Event('a')) is True
+        assert dispatcher.notify(notifications.Event('b')) is True
+        assert dispatcher.notify(notifications.Event('c')) is False
+        assert dispatcher.stats['dropped'] == 1
+        dispatcher.start()
+        dispatcher.stop()
+        assert sink.batches == [['a', 'b']]
+
+    def test_flush_not_running(self):
+        """
+        Ensure flushing a dispatcher which is not running raises.
+        """
+        dispatcher = notifications.Dispatcher([])
+        with pytest.raises(notifications.NotificationError):
+            dispatcher.flush()
+        dispatcher.start()
+        dispatcher.flush()
+        dispatcher.stop()
+        with pytest.raises(notifications.NotificationError):
+            dispatcher.flush()
@@ -0,0 +1,78 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Email notification tests.
+"""
+
+import smtplib
+
+import pytest
+
+from release_dashboard.notifications import Event, NotificationError
+from release_dashboard.notifications.mail import EmailChannel
+
+
+class FakeSMTP:
+    """
+    Stand in for smtplib.SMTP which keeps sent messages.
+    """
+    sent = []
+    fail = False
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def __enter__(self):
+        if FakeSMTP.fail:
+            raise smtplib.SMTPConnectError(421, 'busy')
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def send_message(self, msg):
+        FakeSMTP.sent.append(msg)
+
+
+class TestEmailChannel:
+
+    def test_send(self):
+        """
+        Verify a batch is mailed as a single digest.
+        """
+        FakeSMTP.sent = []
+        FakeSMTP.fail = False
+        channel = EmailChannel(
+            'smtp.example.com', 'dashboard@example.com',
+            ['a@example.com', 'b@example.com'], smtp=FakeSMTP)
+        channel.send([Event('a'), Event('b')])
+        assert len(FakeSMTP.sent) == 1
+        msg = FakeSMTP.sent[0]
+        assert msg['To'] == 'a@example.com, b@example.com'
+        assert msg['Subject'] == 'Release dashboard: 2 update(s)'
+        assert msg.get_content() == '2 updates:\n- a\n- b\n'
+
+    def test_send_error(self):
+        """
+        Ensure SMTP errors raise NotificationError.
+        """
+        FakeSMTP.fail = True
+        channel = EmailChannel(
+            'smtp.example.com', 'dashboard@example.com', ['a@example.com'],
+            smtp=FakeSMTP)
+        with pytest.raises(NotificationError):
+            channel.send([Event('a')])
+        FakeSMTP.fail = False
@@ -0,0 +1,104 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Webhook notification tests.
+"""
+
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from release_dashboard.notifications import (
+    Dispatcher, Event, NotificationError)
+from release_dashboard.notifications.webhook import ChatChannel, WebhookChannel
+
+
+class Sink(BaseHTTPRequestHandler):
+    """
+    Handler storing posted JSON documents on the server.
+    """
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.posts.append(json.loads(self.rfile.read(length)))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sink():
+    """
+    Runs a local HTTP server which accepts webhook posts.
+    """
+    server = HTTPServer(('127.0.0.1', 0), Sink)
+    server.posts = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server):
+    return 'http://127.0.0.1:{}/hook'.format(server.server_address[1])
+
+
+class TestWebhookChannel:
+
+    def test_send(self, sink):
+        """
+        Verify batches are posted as one JSON document.
+        """
+        with Dispatcher([WebhookChannel(url(sink))]) as dispatcher:
+            dispatcher.notify(Event('a', key='x'))
+            dispatcher.notify(Event('b', key='x'))
+            dispatcher.notify(Event('c'))
+        assert len(sink.posts) == 1
+        assert [e['subject'] for e in sink.posts[0]['events']] == ['b', 'c']
+
+    def test_error_status(self, sink):
+        """
+        Ensure error responses raise NotificationError.
+        """
+        sink.status = 500
+        with pytest.raises(NotificationError):
+            WebhookChannel(url(sink)).send([Event('a')])
+
+    def test_unreachable(self, sink):
+        """
+        Ensure connection errors raise NotificationError.
+        """
+        channel = WebhookChannel(url(sink), timeout=1)
+        sink.shutdown()
+        sink.server_close()
+        with pytest.raises(NotificationError):
+            channel.send([Event('a')])
+
+
+class TestChatChannel:
+
+    def test_send(self, sink):
+        """
+        Verify chat hooks get a text digest.
+        """
+        ChatChannel(url(sink)).send([Event('a'), Event('b')])
+        assert sink.posts == [{'text': '2 updates:\n- a\n- b\n'}]
@@ -0,0 +1,245 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Pipeline tests.
+"""
+
+import threading
+
+import pytest
+
+from unittest import mock
+
+from release_dashboard import pipeline
+from release_dashboard.checks.version import ComposeVersion
+
+
+class FakeSniffer:
+    """
+    Stand in for OstreeVersionSniffer which counts uses.
+    """
+    calls = 0
+
+    def __init__(self, version, session=None):
+        self.version = version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def get_ostree_version(self):
+        FakeSniffer.calls += 1
+        return '27.16'
+
+
+class TestMemoStore:
+
+    def test_in_memory(self):
+        """
+        Ensure outputs are found after being set.
+        """
+        store = pipeline.MemoStore()
+        assert store.get('key') == (False, None)
+        store.set('key', {'a': 1})
+        assert store.get('key') == (True, {'a': 1})
+
+    def test_on_disk(self, tmpdir):
+        """
+        Verify outputs persist between instances when given a path.
+        """
+        pipeline.MemoStore(str(tmpdir)).set('key', [1, 2])
+        store = pipeline.MemoStore(str(tmpdir))
+        assert store.get('key') == (True, [1, 2])
+        assert store.get('missing') == (False, None)
+
+
+class TestPipeline:
+
+    def test_run_order(self):
+        """
+        Ensure steps get their requirements and run after them.
+        """
+        p = pipeline.Pipeline([
+            pipeline.Step('b', lambda a: a + 'b', ['a']),
+            pipeline.Step('a', lambda start: start + 'a', ['start']),
+        ])
+        assert p.order(['start']) == ['a', 'b']
+        assert p.run(start='>') == {'a': '>a', 'b': '>ab'}
+
+    def test_independent_steps_run_in_parallel(self):
+        """
+        Verify steps without dependencies between them run at once.
+        """
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet():
+            barrier.wait()
+            return True
+
+        p = pipeline.Pipeline([
+            pipeline.Step('one', meet),
+            pipeline.Step('two', meet),
+        ])
+        assert p.run() == {'one': True, 'two': True}
+
+    def test_invalid_graphs(self):
+        """
+        Ensure duplicates, cycles and unknown requirements are rejected.
+        """
+        p = pipeline.Pipeline([pipeline.Step('a', None, ['b'])])
+        with pytest.raises(pipeline.PipelineError):
+            p.add(pipeline.Step('a', None))
+        with pytest.raises(pipeline.PipelineError):
+            p.run()
+        p.add(pipeline.Step('b', None, ['a']))
+        with pytest.raises(pipeline.PipelineError) as err:
+            p.run()
+        assert 'Cycle' in str(err.value)
+
+    def test_resume_after_failure(self):
+        """
+        Verify a rerun reuses memoized outputs instead of redoing steps.
+        """
+        calls = []
+
+        def expensive(start):
+            calls.append(start)
+            return start * 2
+
+        def flaky(expensive):
+            if len(calls) == 1 and not flaky.retried:
+                flaky.retried = True
+                raise ValueError('boom')
+            return expensive + 1
+        flaky.retried = False
+
+        p = pipeline.Pipeline([
+            pipeline.Step('expensive', expensive, ['start']),
+            pipeline.Step('flaky', flaky, ['expensive']),
+        ])
+        with pytest.raises(pipeline.PipelineError) as err:
+            p.run(start=2)
+        assert 'flaky' in str(err.value)
+        assert p.run(start=2) == {'expensive': 4, 'flaky': 5}
+        assert calls == [2]
+        # New input means the step is run again
+        p.run(start=3)
+        assert calls == [2, 3]
+
+    def test_unserializable_inputs(self):
+        """
+        Ensure inputs that can not be keyed raise a PipelineError.
+        """
+        p = pipeline.Pipeline([pipeline.Step('a', lambda obj: 1, ['obj'])])
+        with pytest.raises(pipeline.PipelineError):
+            p.run(obj=object())
+        p = pipeline.Pipeline([
+            pipeline.Step('a', lambda obj: 1, ['obj'], memoize=False)])
+        assert p.run(obj=object()) == {'a': 1}
+
+
+class TestReleasePipeline:
+
+    def test_release(self):
+        """
+        Verify the release pipeline assembles the ticket context.
+        """
+        check = mock.MagicMock()
+        check.has_version.return_value = True
+        check.verify_compose_status.return_value = True
+        check.latest_updates_compose.return_value = (
+            ComposeVersion.parse('Fedora-27-updates-20180212.0'))
+        tracker = mock.MagicMock()
+        tracker.create_templatized_issue.return_value = '100'
+        FakeSniffer.calls = 0
+
+        p = pipeline.release_pipeline(
+            tracker, check=check, sniffer=FakeSniffer)
+        params = {'version': 'Fedora-Atomic-27-20180213.0'}
+        results = p.run(**params)
+        assert results['ticket'] == '100'
+        assert results['ostree_pungi_id'] == '20180212.0'
+        check.latest_updates_compose.assert_called_once_with(
+            'Fedora-Atomic-27-20180213.0')
+        expected = {
+            'compose': 'Fedora-Atomic-27-20180213.0',
+            'ostree_pungi_id': '20180212.0',
+            'ostree_version': '27.16',
+        }
+        assert results['ticket_context'] == expected
+        tracker.create_templatized_issue.assert_called_once_with(
+            'Two week release of Fedora Atomic Host 27.16',
+            'create_release_request.txt', expected)
+        context = tracker.create_templatized_issue.call_args[0][2]
+        assert context['compose'].release == '27'
+        assert context['compose'].pungi_id == '20180213.0'
+
+        # A second run reuses everything
+        p.run(**params)
+        assert FakeSniffer.calls == 1
+        assert tracker.create_templatized_issue.call_count == 1
+
+    def test_release_compose_version(self):
+        """
+        Ensure versions from get_versions can be passed and are memoized
+        like their string.
+        """
+        check = mock.MagicMock()
+        check.latest_updates_compose.return_value = (
+            ComposeVersion.parse('Fedora-27-updates-20180212.0'))
+        tracker = mock.MagicMock()
+        FakeSniffer.calls = 0
+        p = pipeline.release_pipeline(
+            tracker, check=check, sniffer=FakeSniffer)
+        version = ComposeVersion.parse('Fedora-Atomic-27-20180213.0')
+        results = p.run(version=version)
+        assert results['ticket_context']['compose'] == str(version)
+        p.run(version=str(version))
+        assert FakeSniffer.calls == 1
+        assert tracker.create_templatized_issue.call_count == 1
+
+    def test_release_not_ready(self):
+        """
+        Ensure unknown or unfinished composes stop the pipeline.
+        """
+        check = mock.MagicMock()
+        check.has_version.return_value = True
+        check.verify_compose_status.return_value = False
+        tracker = mock.MagicMock()
+        p = pipeline.release_pipeline(
+            tracker, check=check, sniffer=FakeSniffer)
+        with pytest.raises(pipeline.PipelineError) as err:
+            p.run(version='Fedora-Atomic-27-20180213.0')
+        assert 'not finished' in str(err.value)
+
+        check.has_version.return_value = False
+        check.verify_compose_status.return_value = True
+        with pytest.raises(pipeline.PipelineError):
+            p.run(version='Fedora-Atomic-27-20180213.9')
+        assert tracker.create_templatized_issue.called is False
+
+    def test_no_updates_compose(self):
+        """
+        Ensure a missing updates compose stops the pipeline.
+        """
+        check = mock.MagicMock()
+        check.latest_updates_compose.return_value = None
+        p = pipeline.release_pipeline(
+            mock.MagicMock(), check=check, sniffer=FakeSniffer)
+        with pytest.raises(pipeline.PipelineError) as err:
+            p.run(version='Fedora-Atomic-27-20180213.0')
+        assert 'No updates compose' in str(err.value)
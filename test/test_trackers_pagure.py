@@ -20,9 +20,11 @@ import os
 
 import libpagure
 import pytest
+import requests
 
 from unittest import mock
 
+from release_dashboard.checks.version import ComposeVersion
 from release_dashboard.trackers import TrackerError
 from release_dashboard.trackers.pagure import PagureTracker
 
@@ -38,6 +40,15 @@ class TestPagureTracker:
             PagureTracker('mine', auth_token=None)
         assert PagureTracker('mine', auth_token='123')
 
+    def test_init_with_session(self):
+        """
+        Ensure a given session is used and gets the auth header.
+        """
+        session = requests.Session()
+        pg = PagureTracker('mine', auth_token='123', session=session)
+        assert pg.pg.session is session
+        assert session.headers['Authorization'] == 'token 123'
+
     def test_create_issue(self):
         """
         Ensure creation of issues works as expected.
@@ -73,8 +84,14 @@ class TestPagureTracker:
             _ci.return_value = expected_result
 
             pg = PagureTracker('mine', auth_token='123')
+            context = {
+                'compose': ComposeVersion.parse('Fedora-Atomic-27-20180213.0'),
+                'ostree_pungi_id': '20180212.0',
+            }
             assert pg.create_templatized_issue(
-                'title', 'create_release_request.txt', {}) == expected_result
+                'title', 'create_release_request.txt',
+                context) == expected_result
+            assert 'Fedora-Atomic-27-20180213.0' in _ci.call_args[0][1]
 
     def test_create_templateized_issue_with_errors(self):
         """
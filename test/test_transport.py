@@ -0,0 +1,260 @@
+# Copyright (C) 2018  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Transport tests.
+"""
+
+import gzip
+import json
+import os
+import threading
+
+from io import BytesIO
+
+import pytest
+import requests
+
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from bench.kojipkgs import SimulatedKojipkgs
+from release_dashboard import transport
+from release_dashboard.checks import AtomicStatusCheck, download
+
+
+KOJI = 'https://kojipkgs.fedoraproject.org/compose/twoweek/'
+
+
+class FakeKoji(BaseAdapter):
+    """
+    Adapter standing in for kojipkgs.
+    """
+
+    def __init__(self):
+        super().__init__()
+        with open('test/versions.html', 'rb') as fobj:
+            self.pages = {
+                KOJI + '?C=M;O=D': (200, fobj.read()),
+                KOJI + 'Fedora-Atomic-27-20180213.0/STATUS': (
+                    200, b'FINISHED\n'),
+                KOJI + 'Fedora-Atomic-27-20180213.1/STATUS': (
+                    404, b'Not Found\n'),
+                KOJI + 'image.qcow2': (200, bytes(range(256)) * 4),
+            }
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.sent.append(request.url)
+        url = request.url.replace(
+            'http://staging', 'https://kojipkgs.fedoraproject.org')
+        status, body = self.pages.get(url, (404, b''))
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers = CaseInsensitiveDict({
+            'Content-Type': 'text/html; charset=utf-8',
+            'Content-Encoding': 'identity'})
+        resp.raw = BytesIO(body)
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+def record(path):
+    """
+    Records a dashboard session against FakeKoji into path.
+    """
+    session = requests.Session()
+    session.mount('https://', transport.RecordingAdapter(path, FakeKoji()))
+    check = AtomicStatusCheck(session=session)
+    versions = list(check.get_versions())
+    statuses = [check.verify_compose_status(v) for v in versions]
+    image = session.get(KOJI + 'image.qcow2').content
+    session.close()
+    return versions, statuses, image
+
+
+class TestRecordReplay:
+
+    def test_round_trip(self, tmpdir):
+        """
+        Verify a replayed session sees exactly what was recorded.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        versions, statuses, image = record(archive)
+        assert statuses == [True, False]
+        exchanges = transport.load_archive(archive)
+        assert len(exchanges) == 4
+        assert 'Content-Encoding' not in exchanges[0]['headers']
+        # Bodies live next to the archive, not inside it
+        bodies = transport.body_directory(archive)
+        assert all('text' not in e and 'base64' not in e for e in exchanges)
+        assert os.path.getsize(
+            os.path.join(bodies, exchanges[-1]['body'])) > 0
+        assert exchanges[-1]['size'] == 1024
+        assert all(e['transfer'] >= 0 for e in exchanges)
+
+        check = AtomicStatusCheck(session=transport.replay_session(archive))
+        assert list(check.get_versions()) == versions
+        assert [check.verify_compose_status(v) for v in versions] == statuses
+        session = transport.replay_session(archive)
+        resp = session.get(KOJI + 'image.qcow2', stream=True)
+        assert b''.join(resp.iter_content(chunk_size=100)) == image
+
+    def test_unknown_request(self, tmpdir):
+        """
+        Ensure requests missing from the archive raise a TransportError.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        record(archive)
+        session = transport.replay_session(archive)
+        with pytest.raises(transport.TransportError):
+            session.get(KOJI + 'unknown')
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get(KOJI + 'unknown')
+
+    def test_repeated_requests(self, tmpdir):
+        """
+        Verify repeats get recorded responses in order, then the last one.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        fake = FakeKoji()
+        session = requests.Session()
+        session.mount('https://', transport.RecordingAdapter(archive, fake))
+        url = KOJI + 'Fedora-Atomic-27-20180213.0/STATUS'
+        session.get(url)
+        fake.pages[url] = (200, b'DOOMED\n')
+        session.get(url)
+        session.close()
+
+        session = transport.replay_session(archive)
+        assert [session.get(url).text for _ in range(3)] == [
+            'FINISHED\n', 'DOOMED\n', 'DOOMED\n']
+
+    def test_streamed_recording(self, tmpdir):
+        """
+        Verify streamed bodies are recorded as they are read, not up front.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        fake = FakeKoji()
+        fake.pages[KOJI + 'big.qcow2'] = (200, bytes(1024 * 1024))
+        raws = []
+        send = fake.send
+
+        def tracking_send(request, **kwargs):
+            resp = send(request, **kwargs)
+            raws.append(resp.raw)
+            return resp
+
+        fake.send = tracking_send
+        session = requests.Session()
+        session.mount('https://', transport.RecordingAdapter(archive, fake))
+        resp = session.get(KOJI + 'big.qcow2', stream=True)
+        chunks = resp.iter_content(chunk_size=4096)
+        next(chunks)
+        assert raws[0].tell() == 4096
+        assert sum(len(chunk) for chunk in chunks) == 1024 * 1024 - 4096
+        session.close()
+
+        session = transport.replay_session(archive)
+        resp = session.get(KOJI + 'big.qcow2', stream=True)
+        assert sum(len(c) for c in resp.iter_content(65536)) == 1024 * 1024
+
+    def test_live_server(self, tmpdir):
+        """
+        Ensure streamed downloads from a real server are recorded.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        with SimulatedKojipkgs(composes=1, image_size=300000) as koji:
+            url = koji.image_url(koji.versions[0])
+            session = transport.recording_session(archive)
+            assert download(url, str(tmpdir.join('a')), session) == 300000
+            session.close()
+        session = transport.replay_session(archive)
+        assert download(url, str(tmpdir.join('b')), session) == 300000
+
+    def test_replay_speed(self, tmpdir):
+        """
+        Ensure recorded header and body timings are replayed scaled by speed.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        bodies = transport.body_directory(archive)
+        os.makedirs(bodies)
+        with gzip.open(os.path.join(bodies, '000001.gz'), 'wb') as fobj:
+            fobj.write(bytes(100000))
+        with gzip.open(archive, 'wt', encoding='utf8') as fobj:
+            fobj.write(json.dumps({
+                'method': 'GET', 'url': KOJI + 'image.qcow2', 'status': 200,
+                'headers': {}, 'elapsed': 0.5, 'body': '000001.gz',
+                'transfer': 2.0, 'size': 100000}) + '\n')
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        adapter = transport.ReplayAdapter(
+            archive, speed=2.0, sleep=sleep, clock=lambda: now[0])
+        session = requests.Session()
+        session.mount('https://', adapter)
+        resp = session.get(KOJI + 'image.qcow2', stream=True)
+        assert slept == [0.25]
+        assert sum(len(c) for c in resp.iter_content(25000)) == 100000
+        assert slept == [0.25] * 5
+
+        # Full speed replays never wait
+        session = transport.replay_session(archive)
+        assert len(session.get(KOJI + 'image.qcow2').content) == 100000
+
+
+class TestLoadReplayer:
+
+    def test_run(self, tmpdir):
+        """
+        Verify the archive is sent repeat times and mismatches are counted.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        record(archive)
+        fake = FakeKoji()
+        # The deployment under test lost a compose
+        del fake.pages[KOJI + 'Fedora-Atomic-27-20180213.0/STATUS']
+        session = requests.Session()
+        session.mount('http://', fake)
+        stats = transport.LoadReplayer(
+            archive, concurrency=4, repeat=3, session=session,
+            rewrite=('https://kojipkgs.fedoraproject.org',
+                     'http://staging')).run()
+        assert stats['requests'] == 12
+        assert stats['errors'] == 3
+        assert stats['concurrency'] == 4
+        assert len(fake.sent) == 12
+        assert all(url.startswith('http://staging/') for url in fake.sent)
+        assert stats['latency_max'] >= stats['latency_median']
+
+    def test_connection_pool(self, tmpdir):
+        """
+        Verify the default session pools a connection per client.
+        """
+        archive = str(tmpdir.join('koji.jsonl.gz'))
+        record(archive)
+        replayer = transport.LoadReplayer(archive, concurrency=32)
+        adapter = replayer._session.get_adapter('https://x')
+        assert adapter._pool_connections == 32
+        assert adapter._pool_maxsize == 32